@@ -0,0 +1,161 @@
+"""从网页自己发出的 XHR 请求里找出化妆品数据和标准 PDF 的地址.
+
+NMPA 数据查询页面的列表和详情都是前端通过 XHR 请求 JSON 后渲染出来的.capture 模式
+照常操作页面(筛选,翻页,点开详情),用 ResponseRecorder 记下页面发出的 XHR/fetch
+响应,接口地址和字段名都按观察到的内容认出来,不预先假设:
+
+- 列表接口: 表格刷新后,JSON 里有记录的某个字段等于表格里注册证号的那个响应;
+- 详情接口: 点开一条记录的详情时,返回的 JSON 里有标准 PDF 地址的那个响应.列表记录
+  里出现在这个请求地址或表单里的字段就是记录 id,之后的记录把它换成自己的 id 重放
+  这个请求,不用再打开详情页和 PDF 查看器.
+
+表格里的各列仍然从页面上读,接口 JSON 只用来找记录 id 和标准 PDF 地址.页面发出的
+请求里找不到表格里的数据时抛出 CaptureError,并列出实际看到的请求.
+"""
+
+import json
+import urllib.parse
+
+# 记录 id 至少有这么长,避免把 "1" 这样的短字段值误认成 id
+MIN_ID_LENGTH = 4
+
+
+class CaptureError(Exception):
+    """页面发出的请求里找不到表格里的数据."""
+
+
+class ResponseRecorder:
+    """记下页面发出的 XHR/fetch 响应,用 context.on("response", recorder.on_response) 注册."""
+
+    def __init__(self):
+        self.responses = []
+
+    def on_response(self, response):
+        if response.request.resource_type in ("xhr", "fetch") and response.status == 200:
+            self.responses.append(response)
+
+    def take(self) -> list:
+        """取出并清空目前记下的响应."""
+        responses, self.responses = self.responses, []
+        return responses
+
+
+def read_json(response):
+    """读取响应的 JSON,不是 JSON 时返回 None."""
+    try:
+        return response.json()
+    except Exception:
+        try:
+            return json.loads(response.text())
+        except Exception:
+            return None
+
+
+def iter_records(payload):
+    """按出现顺序逐个产出 JSON 里所有列表中的字典,包括嵌套的."""
+    if isinstance(payload, list):
+        for item in payload:
+            if isinstance(item, dict):
+                yield item
+            yield from iter_records(item)
+    elif isinstance(payload, dict):
+        for value in payload.values():
+            yield from iter_records(value)
+
+
+def describe(responses) -> list:
+    """用于报错: 每个响应的请求方法和地址."""
+    return ["{} {}".format(response.request.method, response.url) for response in responses]
+
+
+def match_records(responses, numbers) -> dict:
+    """在记下的响应里找列表接口,返回 {注册证号: 接口里的记录}.
+
+    从最新的响应往前找,第一个包含表格里注册证号的响应就是列表接口.没有任何响应
+    包含这些注册证号时抛出 CaptureError.
+    """
+    wanted = set(numbers)
+    for response in reversed(responses):
+        found = {}
+        for record in iter_records(read_json(response)):
+            for value in record.values():
+                if isinstance(value, str) and value.strip() in wanted:
+                    found.setdefault(value.strip(), record)
+                    break
+        if found:
+            return found
+    raise CaptureError("表格里的注册证号({})不在页面发出的任何 XHR 响应里,看到的请求: {}".format(
+        ", ".join(sorted(wanted)[:3]), describe(responses)))
+
+
+def find_pdf_url(payload) -> str:
+    """在详情 JSON 里找标准 PDF 的地址,查看器地址里的 url= 参数会被解码出来."""
+    if isinstance(payload, dict):
+        values = payload.values()
+    elif isinstance(payload, list):
+        values = payload
+    elif isinstance(payload, str):
+        if ".pdf" not in payload.lower():
+            return ""
+        if "url=" in payload:
+            return urllib.parse.unquote(payload.split("url=")[1].split("&")[0])
+        return payload
+    else:
+        return ""
+    for value in values:
+        url = find_pdf_url(value)
+        if url:
+            return url
+    return ""
+
+
+def id_value(value) -> str:
+    """可以当作记录 id 的字段值(字符串或整数),其他类型返回空字符串."""
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return ""
+    return str(value)
+
+
+def find_detail(responses, record: dict = None):
+    """在点开详情时记下的响应里找标准 PDF 地址,返回 (PDF 地址, 重放详情请求的模板).
+
+    没有带 PDF 地址的响应时地址为空字符串.record 是这条记录在列表接口里的数据,
+    它的某个字段出现在带 PDF 地址的请求的地址或表单里时,这个请求就是详情接口,
+    返回的模板交给 replay_request 使用;认不出来时模板为 None.
+    """
+    for response in responses:
+        pdf_url = find_pdf_url(read_json(response))
+        if not pdf_url:
+            continue
+        request = response.request
+        body = request.post_data or ""
+        for key, value in (record or {}).items():
+            value = id_value(value)
+            if len(value) >= MIN_ID_LENGTH and (value in request.url or value in body):
+                return pdf_url, {
+                    "url": request.url,
+                    "method": request.method,
+                    "headers": {
+                        k: v for k, v in request.headers.items()
+                        if not k.startswith(":") and k.lower() not in ("host", "content-length")
+                    },
+                    "post_data": request.post_data,
+                    "id_key": key,
+                    "id_value": value,
+                }
+        return pdf_url, None
+    return "", None
+
+
+def replay_request(template: dict, record: dict):
+    """把模板里的记录 id 换成 record 的 id,返回 fetch 用的参数;record 没有这个字段时返回 None."""
+    new_id = id_value(record.get(template["id_key"]))
+    if not new_id:
+        return None
+    old_id = template["id_value"]
+    return {
+        "url": template["url"].replace(old_id, urllib.parse.quote(new_id, safe="")),
+        "method": template["method"],
+        "headers": template["headers"],
+        "data": template["post_data"].replace(old_id, new_id) if template["post_data"] else None,
+    }
@@ -0,0 +1,202 @@
+"""下载产品执行标准 PDF 并提取全文.
+
+爬虫只在 "产品执行标准全文" 一列里保存了 PDF 的地址.这个脚本读取爬虫输出的 CSV,
+用线程池和共用的连接池并发下载 PDF,按文件内容的 SHA-256 去重保存,再用进程池
+提取文字,最后按注册证号把全文存进 SQLite,离线也能搜索.
+
+重复运行时已经下载过的地址会带上 ETag / Last-Modified 发条件请求,服务器返回
+304 就不再下载;内容没变的文件也不会重新提取文字.
+
+    python nmpa_pdf.py --csv guangdong_cosmetics_v2.csv --workers 8
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from nmpa_profile import USER_AGENT
+from nmpa_sink import read_rows
+
+CSV_FILE = "guangdong_cosmetics_v2.csv"
+DB_FILE = "standards.db"
+PDF_DIR = "standard_pdfs"
+URL_COLUMN = "产品执行标准全文"
+KEY_COLUMN = "注册证号"
+# 同时下载的线程数
+WORKERS = 8
+# 提取文字的进程数,None 表示按 CPU 核数
+PROCESSES = None
+
+
+def open_db(db_file=DB_FILE):
+    db = sqlite3.connect(db_file)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS downloads (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS texts (
+            sha256 TEXT PRIMARY KEY,
+            pages INTEGER,
+            text TEXT
+        );
+        CREATE TABLE IF NOT EXISTS standards (
+            reg_no TEXT PRIMARY KEY,
+            url TEXT
+        );
+    """)
+    return db
+
+
+def new_session(pool_size=WORKERS):
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def load_standards(csv_file):
+    """从爬虫输出里读出 {注册证号: PDF 地址},跳过没有地址的行."""
+    standards = {}
+    for row in read_rows(csv_file):
+        url = (row.get(URL_COLUMN) or "").strip()
+        reg_no = (row.get(KEY_COLUMN) or "").strip()
+        if reg_no and url.startswith("http"):
+            standards[reg_no] = url
+    return standards
+
+
+def pdf_path(sha256):
+    return os.path.join(PDF_DIR, sha256[:2], sha256 + ".pdf")
+
+
+def download(session, url, known):
+    """下载一个 PDF,返回 (url, sha256, etag, last_modified),内容没有变化时 sha256 沿用旧值.
+
+    known 是上次下载时记录的 (sha256, etag, last_modified),没有下载过时为 None.
+    """
+    headers = {}
+    if known is not None and os.path.exists(pdf_path(known[0])):
+        if known[1]:
+            headers["If-None-Match"] = known[1]
+        if known[2]:
+            headers["If-Modified-Since"] = known[2]
+    response = session.get(url, headers=headers, timeout=60)
+    if response.status_code == 304:
+        return url, known[0], known[1], known[2]
+    response.raise_for_status()
+    content = response.content
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = pdf_path(sha256)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as fp:
+            fp.write(content)
+        os.replace(tmp_path, path)
+    return url, sha256, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+
+def extract_text(sha256):
+    """在子进程里提取一个 PDF 的文字,返回 (sha256, 页数, 全文)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path(sha256))
+    pages = [page.extract_text() or "" for page in reader.pages]
+    return sha256, len(pages), "\n".join(pages)
+
+
+def run(csv_file=CSV_FILE, db_file=DB_FILE, workers=WORKERS, processes=PROCESSES, refresh_after=None):
+    """下载 csv_file 里所有标准 PDF 并提取文字.
+
+    refresh_after 为秒数时,超过这个时间没检查过的地址会发条件请求确认有没有更新;
+    为 None 时下载过的地址不再检查.
+    """
+    start = time.time()
+    db = open_db(db_file)
+    standards = load_standards(csv_file)
+    db.executemany("INSERT OR REPLACE INTO standards (reg_no, url) VALUES (?, ?)", standards.items())
+    db.commit()
+
+    known = {row[0]: row[1:] for row in db.execute(
+        "SELECT url, sha256, etag, last_modified, fetched_at FROM downloads")}
+    now = time.time()
+    urls = sorted({
+        url for url in standards.values()
+        if url not in known or not os.path.exists(pdf_path(known[url][0]))
+        or (refresh_after is not None and now - (known[url][3] or 0) > refresh_after)
+    })
+    print(f"共 {len(standards)} 个注册证号,{len(set(standards.values()))} 个不同的地址,需要下载/检查 {len(urls)} 个。")
+
+    session = new_session(workers)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(download, session, url, known.get(url)): url for url in urls}
+        for future in futures:
+            url = futures[future]
+            try:
+                url, sha256, etag, last_modified = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"下载失败: {url} {e}")
+                continue
+            db.execute("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?)",
+                       (url, sha256, etag, last_modified, time.time()))
+            db.commit()
+    session.close()
+
+    pending = [row[0] for row in db.execute("""
+        SELECT DISTINCT d.sha256 FROM downloads d
+        LEFT JOIN texts t ON t.sha256 = d.sha256
+        WHERE d.sha256 IS NOT NULL AND t.sha256 IS NULL
+    """)]
+    print(f"需要提取文字的 PDF: {len(pending)} 个。")
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(extract_text, sha256): sha256 for sha256 in pending}
+        for future in futures:
+            try:
+                sha256, pages, text = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"提取文字失败: {pdf_path(futures[future])} {e}")
+                continue
+            db.execute("INSERT OR REPLACE INTO texts VALUES (?, ?, ?)", (sha256, pages, text))
+            db.commit()
+
+    print(f"完成,耗时 {time.time() - start:.1f}s,失败 {failed} 个。全文保存在 {db_file}。")
+    db.close()
+
+
+def standard_text(db, reg_no):
+    """按注册证号查询标准全文,没有时返回 None."""
+    row = db.execute("""
+        SELECT t.text FROM standards s
+        JOIN downloads d ON d.url = s.url
+        JOIN texts t ON t.sha256 = d.sha256
+        WHERE s.reg_no = ?
+    """, (reg_no,)).fetchone()
+    return row[0] if row else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="下载产品执行标准 PDF 并提取全文")
+    parser.add_argument("--csv", default=CSV_FILE, help="爬虫输出的 CSV 文件")
+    parser.add_argument("--db", default=DB_FILE, help="保存全文的 SQLite 数据库")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="同时下载的线程数")
+    parser.add_argument("--processes", type=int, default=PROCESSES, help="提取文字的进程数")
+    parser.add_argument("--refresh-days", type=float, default=None,
+                        help="超过这么多天没检查过的 PDF 重新发条件请求确认有没有更新")
+    args = parser.parse_args()
+    refresh_after = args.refresh_days * 86400 if args.refresh_days is not None else None
+    run(args.csv, args.db, args.workers, args.processes, refresh_after)
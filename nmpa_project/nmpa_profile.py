@@ -0,0 +1,260 @@
+"""浏览器启动配置和页面加载测量.
+
+default 配置和原来一样: 有界面,放慢操作,加载页面上的所有资源,用固定的等待时间.
+fast 配置: 无界面,拦截图片,字体,样式表和第三方网站的请求,翻页和筛选时等表格
+第一行的注册证号变了就继续,不再固定等待几秒.等的是页面上的表格,不依赖
+接口地址.
+"""
+
+import json
+import os
+import time
+import urllib.parse
+
+# 表格第一个数据行(带详情按钮)的注册证号(第 4 列),没有数据行时为 null
+FIRST_ROW_JS = """() => {
+    const row = Array.from(document.querySelectorAll('tr')).find(r => r.innerText.includes('详情'));
+    if (!row) return null;
+    const cells = row.querySelectorAll('td');
+    return cells.length > 3 ? cells[3].innerText.trim() : row.innerText;
+}"""
+# 第一行的注册证号和操作前不一样时为真
+ROWS_CHANGED_JS = "old => { const first = (" + FIRST_ROW_JS + ")(); return first !== null && first !== old; }"
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+PROFILES = {
+    "default": {
+        "headless": False,
+        "slow_mo": 1000,
+        "args": ["--start-maximized"],
+        # 拦截的资源类型
+        "block_types": [],
+        # 只允许这些域名(及其子域名)的资源,None 表示不限制;页面跳转本身不拦截
+        "allowed_hosts": None,
+        # 点击后等表格内容变化,而不是固定等待
+        "event_waits": False,
+    },
+    "fast": {
+        "headless": True,
+        "slow_mo": 0,
+        "args": [],
+        "block_types": ["image", "media", "font", "stylesheet"],
+        "allowed_hosts": ["nmpa.gov.cn"],
+        "event_waits": True,
+    },
+}
+
+
+def launch(playwright, profile, headless=None):
+    """按配置启动 Chromium,headless 不为 None 时覆盖配置里的值."""
+    return playwright.chromium.launch(
+        headless=profile["headless"] if headless is None else headless,
+        slow_mo=profile["slow_mo"],
+        args=profile["args"],
+    )
+
+
+def new_context(browser, profile, stats=None):
+    """按配置创建浏览器上下文,需要时注册资源拦截和加载统计."""
+    context = browser.new_context(
+        user_agent=USER_AGENT,
+        viewport={"width": 1920, "height": 1080},
+        ignore_https_errors=True
+    )
+    if profile["block_types"] or profile["allowed_hosts"]:
+        context.route("**/*", lambda route: handle_route(route, profile, stats))
+    if stats is not None:
+        context.on("requestfinished", stats.on_request_finished)
+        context.on("requestfailed", stats.on_request_failed)
+    return context
+
+
+def handle_route(route, profile, stats=None):
+    request = route.request
+    blocked = request.resource_type in profile["block_types"]
+    if not blocked and profile["allowed_hosts"] and request.resource_type != "document":
+        host = urllib.parse.urlsplit(request.url).hostname or ""
+        blocked = not any(host == h or host.endswith("." + h) for h in profile["allowed_hosts"])
+    if blocked:
+        if stats is not None:
+            stats.blocked += 1
+        route.abort()
+    else:
+        route.continue_()
+
+
+def act_and_wait(page, action, profile, sleep=5):
+    """执行会刷新列表的操作(筛选,翻页,跳页),再等列表数据加载完.
+
+    event_waits 为 True 时等表格第一行的注册证号变化,超时后再固定等待 sleep 秒.
+    """
+    if not profile["event_waits"]:
+        action()
+        time.sleep(sleep)
+        return
+    before = page.evaluate(FIRST_ROW_JS)
+    action()
+    try:
+        page.wait_for_function(ROWS_CHANGED_JS, arg=before, timeout=15000)
+    except Exception as e:
+        print(f"等待表格刷新超时,改为固定等待: {e}")
+        time.sleep(sleep)
+
+
+# 统计耗时分布时输出的分位数
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def request_kind(request) -> str:
+    """按用途给请求分类: PDF,接口请求(xhr/fetch 都记为 api),其他按资源类型."""
+    if ".pdf" in request.url.lower():
+        return "pdf"
+    if request.resource_type in ("xhr", "fetch"):
+        return "api"
+    return request.resource_type
+
+
+def quantile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def browser_rss():
+    """爬虫进程和它启动的浏览器进程一共占用的内存(字节),没有安装 psutil 时返回 None."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    process = psutil.Process(os.getpid())
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+class LoadStats:
+    """记录每次打开页面/翻页的耗时,下载的字节数和被拦截的请求数.
+
+    另外按请求的用途(接口请求,PDF,文档等)记录响应时间和字节数,每处理完一页
+    调用 sample() 记录内存占用和每秒写入的行数,设置了 metrics_file 时把快照写到
+    这个文件(以 .prom 结尾时为 Prometheus 文本格式,否则为 JSON).
+    """
+
+    def __init__(self, metrics_file=None):
+        self.page_times = []
+        self.requests = 0
+        self.bytes = 0
+        self.blocked = 0
+        self.failed = 0
+        self.metrics_file = metrics_file
+        self.latencies = {}
+        self.kind_bytes = {}
+        self.rows = 0
+        self.buffered = 0
+        self.rss = None
+        self.started = time.time()
+
+    def on_request_finished(self, request):
+        kind = request_kind(request)
+        size = 0
+        try:
+            sizes = request.sizes()
+            size = sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        except Exception:
+            pass
+        try:
+            # responseEnd 是相对请求开始时间的毫秒数,取不到时为 -1
+            elapsed = request.timing["responseEnd"]
+            if elapsed >= 0:
+                self.latencies.setdefault(kind, []).append(elapsed / 1000)
+        except Exception:
+            pass
+        self.bytes += size
+        self.kind_bytes[kind] = self.kind_bytes.get(kind, 0) + size
+        self.requests += 1
+
+    def on_request_failed(self, request):
+        self.failed += 1
+
+    def sample(self, sink=None):
+        """记录当前的内存占用和写入的行数,设置了 metrics_file 时写快照文件."""
+        if sink is not None:
+            self.rows = sink.count + len(sink.buffer)
+            self.buffered = len(sink.buffer)
+        self.rss = browser_rss()
+        if self.metrics_file:
+            self.write_snapshot(self.metrics_file)
+
+    def snapshot(self) -> dict:
+        elapsed = time.time() - self.started
+        return {
+            "time": time.time(),
+            "uptime": elapsed,
+            "pages": len(self.page_times),
+            "page_seconds": self.page_times[-1] if self.page_times else 0.0,
+            "requests": self.requests,
+            "failed_requests": self.failed,
+            "blocked_requests": self.blocked,
+            "bytes": self.bytes,
+            "rows": self.rows,
+            "rows_per_second": self.rows / elapsed if elapsed else 0.0,
+            "sink_buffered_rows": self.buffered,
+            "rss_bytes": self.rss,
+            "requests_by_kind": {
+                kind: {
+                    "count": len(values),
+                    "bytes": self.kind_bytes.get(kind, 0),
+                    "seconds": {str(q): quantile(values, q) for q in QUANTILES},
+                }
+                for kind, values in sorted(self.latencies.items())
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for key in ("pages", "requests", "failed_requests", "blocked_requests", "bytes", "rows",
+                    "rows_per_second", "sink_buffered_rows", "rss_bytes"):
+            if snapshot[key] is not None:
+                lines.append("nmpa_spider_{} {}".format(key, snapshot[key]))
+        lines.append("# TYPE nmpa_spider_request_seconds summary")
+        for kind, entry in snapshot["requests_by_kind"].items():
+            for q, value in entry["seconds"].items():
+                lines.append('nmpa_spider_request_seconds{{kind="{}",quantile="{}"}} {}'.format(kind, q, value))
+            lines.append('nmpa_spider_request_seconds_count{{kind="{}"}} {}'.format(kind, entry["count"]))
+            lines.append('nmpa_spider_response_bytes{{kind="{}"}} {}'.format(kind, entry["bytes"]))
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        if path.endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        os.replace(tmp_path, path)
+
+    def timed(self, func, *args):
+        """执行 func 并记录耗时,返回 func 的返回值."""
+        start = time.time()
+        result = func(*args)
+        self.page_times.append(time.time() - start)
+        return result
+
+    def report(self, profile_name):
+        if self.page_times:
+            avg = sum(self.page_times) / len(self.page_times)
+        else:
+            avg = 0.0
+        print(f"[{profile_name}] 页面加载 {len(self.page_times)} 次,平均 {avg:.2f}s;"
+              f"请求 {self.requests} 个,下载 {self.bytes / 1024 / 1024:.2f} MB,拦截 {self.blocked} 个")
+        for kind, values in sorted(self.latencies.items()):
+            print(f"  {kind}: {len(values)} 个请求,中位数 {quantile(values, 0.5):.2f}s,"
+                  f"p90 {quantile(values, 0.9):.2f}s,{self.kind_bytes.get(kind, 0) / 1024:.0f} KB")
@@ -0,0 +1,119 @@
+"""抓取结果的批量写入.
+
+数据先放在内存缓冲里,攒够一批或者超过一定时间才写一次文件,不再每条数据都
+创建一个 DataFrame 并打开一次文件.按注册证号去重,重新运行时不会追加重复的
+数据.除了 CSV 还可以同时写一份 SQLite,结束时可以再导出一份 Parquet.
+"""
+
+import csv
+import os
+import sqlite3
+import time
+
+COLUMNS = ["产品名称", "企业名称", "注册证号", "批件状态", "产品执行标准全文"]
+KEY = "注册证号"
+# 这些注册证号表示没有取到,不参与去重
+MISSING_KEYS = ("", "未获取")
+# 攒够多少条写一次
+BATCH_SIZE = 50
+# 距离上次写入超过多少秒也要写一次
+FLUSH_INTERVAL = 10.0
+
+
+class RowSink:
+    """缓冲写入 CSV 的输出文件,按注册证号去重."""
+
+    def __init__(self, output_file, sqlite_file=None, parquet_file=None,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.output_file = output_file
+        self.sqlite_file = sqlite_file
+        self.parquet_file = parquet_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.count = 0
+        self.duplicates = 0
+        self.last_flush = time.time()
+        self.seen = set()
+
+        if os.path.exists(output_file):
+            with open(output_file, "r", encoding="utf-8-sig", newline="") as fp:
+                for row in csv.DictReader(fp):
+                    if row.get(KEY) not in MISSING_KEYS:
+                        self.seen.add(row[KEY])
+        else:
+            with open(output_file, "w", encoding="utf-8-sig", newline="") as fp:
+                csv.writer(fp).writerow(COLUMNS)
+
+        self.db = None
+        if sqlite_file:
+            self.db = sqlite3.connect(sqlite_file)
+            # 没取到注册证号的行存成 NULL,不会互相覆盖
+            self.db.execute("CREATE TABLE IF NOT EXISTS cosmetics ({})".format(
+                ", ".join(f'"{c}" TEXT UNIQUE' if c == KEY else f'"{c}" TEXT' for c in COLUMNS)))
+            self.db.commit()
+
+    def write(self, row):
+        """写入一行,注册证号已经写过时跳过并返回 False."""
+        key = row.get(KEY, "")
+        if key not in MISSING_KEYS:
+            if key in self.seen:
+                self.duplicates += 1
+                print(f"  跳过重复的注册证号: {key}")
+                return False
+            self.seen.add(key)
+        self.buffer.append([row.get(c, "") for c in COLUMNS])
+        if len(self.buffer) >= self.batch_size or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+        return True
+
+    def flush(self):
+        if self.buffer:
+            with open(self.output_file, "a", encoding="utf-8-sig", newline="") as fp:
+                csv.writer(fp).writerows(self.buffer)
+            if self.db is not None:
+                key_index = COLUMNS.index(KEY)
+                rows = [
+                    row[:key_index] + [None] + row[key_index + 1:] if row[key_index] in MISSING_KEYS else row
+                    for row in self.buffer
+                ]
+                self.db.executemany("INSERT OR REPLACE INTO cosmetics VALUES ({})".format(
+                    ", ".join("?" * len(COLUMNS))), rows)
+                self.db.commit()
+            self.count += len(self.buffer)
+            self.buffer = []
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        if self.parquet_file:
+            export_parquet(self.output_file, self.parquet_file)
+        print(f"写入 {self.count} 条数据,跳过重复 {self.duplicates} 条。")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_rows(csv_file):
+    """逐行读取 CSV 输出文件,返回字典."""
+    with open(csv_file, "r", encoding="utf-8-sig", newline="") as fp:
+        yield from csv.DictReader(fp)
+
+
+def export_parquet(csv_file, parquet_file):
+    """把 CSV 导出成 Parquet,需要安装 pyarrow."""
+    try:
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError:
+        print("未安装 pyarrow,跳过 Parquet 导出。可以运行 pip install pyarrow 后重试。")
+        return
+    table = pyarrow.csv.read_csv(csv_file)
+    pyarrow.parquet.write_table(table, parquet_file)
+    print(f"已导出 Parquet 文件: {parquet_file}")
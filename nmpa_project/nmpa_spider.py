@@ -1,251 +1,542 @@
+import argparse
+import cProfile
+import multiprocessing
+import pstats
 import time
-import pandas as pd
 from playwright.sync_api import sync_playwright
 import os
 
-def run():
+import nmpa_capture
+from nmpa_profile import PROFILES, LoadStats, act_and_wait, launch, new_context
+from nmpa_sink import RowSink, read_rows as read_csv_rows
+
+SEARCH_URL = "https://www.nmpa.gov.cn/datasearch/home-index.html?itemId=ff8080818046502f0180f934f6873f78#category=hzp"
+GD_SELECTOR = "a:has-text('广东'), span:has-text('广东'), div:has-text('广东')"
+# 带详情按钮的行和它们的单元格文本,在页面里一次取完
+ROWS_JS = """rows => rows
+    .filter(r => r.innerText.includes('详情'))
+    .map(r => ({
+        cells: Array.from(r.querySelectorAll('td'), td => td.innerText.trim()),
+        text: r.innerText,
+    }))"""
+
+
+def run(mode="ui", workers=1, profile_name="default", measure=False, sqlite=False, parquet=False,
+        metrics_file=None):
+    """mode 为 "ui" 时逐行点击详情页,为 "capture" 时从页面发出的接口请求里取标准地址.
+
+    workers 大于 1 时 ui 模式按页码范围分给多个无界面浏览器进程同时抓取,这时不统计
+    页面加载和性能数据(measure 和 metrics_file 不起作用).
+    profile_name 是 nmpa_profile.PROFILES 里的启动配置,measure 为 True 时统计
+    页面加载耗时和下载量.sqlite / parquet 为 True 时在 CSV 之外另存一份同名的
+    .db / .parquet 文件.metrics_file 不为空时每处理完一页把性能统计写到这个文件.
+    """
+    profile = PROFILES[profile_name]
+    stats = LoadStats(metrics_file) if measure or metrics_file else None
     # 1. 准备工作
     screenshot_dir = "debug_screenshots"
     if not os.path.exists(screenshot_dir):
         os.makedirs(screenshot_dir)
 
     output_file = "guangdong_cosmetics_v2.csv"
-    if not os.path.exists(output_file):
-        df = pd.DataFrame(columns=["产品名称", "企业名称", "注册证号", "批件状态", "产品执行标准全文"])
-        df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    base_name = os.path.splitext(output_file)[0]
+    sink = RowSink(output_file,
+                   sqlite_file=base_name + ".db" if sqlite else None,
+                   parquet_file=base_name + ".parquet" if parquet else None)
+
+    if mode == "ui" and workers > 1:
+        with sink:
+            run_parallel(workers, output_file, screenshot_dir, profile_name, sink)
+        print(f"任务完成。文件已保存至 {output_file}")
+        return
 
     print("启动浏览器...")
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False, slow_mo=1000, args=['--start-maximized'])
+    with sync_playwright() as p, sink:
+        browser = launch(p, profile)
+        context = new_context(browser, profile, stats)
+        page = context.new_page()
 
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            viewport={"width": 1920, "height": 1080},
-            ignore_https_errors=True
-        )
+        if mode == "capture":
+            run_capture(page, context, sink, screenshot_dir, profile, stats)
+        else:
+            run_ui(page, context, sink, screenshot_dir, profile, stats)
+
+        print(f"任务完成。文件已保存至 {output_file}")
+        if stats is not None:
+            stats.sample(sink)
+            stats.report(profile_name)
+        browser.close()
 
-        page = context.new_page()
 
-        url = "https://www.nmpa.gov.cn/datasearch/home-index.html?itemId=ff8080818046502f0180f934f6873f78#category=hzp"
-        print(f"打开网址: {url}")
+def run_ui(page, context, sink, screenshot_dir, profile, stats=None):
+    """逐行点击详情页和标准查看按钮的抓取方式."""
+    stats = stats or LoadStats()
+    stats.timed(open_and_filter, page, screenshot_dir, profile)
 
+    # --- 开始循环处理 ---
+    page_num = 1
+
+    while True:
+        if not process_page(page, context, sink, screenshot_dir, page_num, profile):
+            break
+        stats.sample(sink)
+
+        # 翻页
+        print("尝试翻页...")
         try:
-            page.goto(url, timeout=60000, wait_until="domcontentloaded")
+            if not stats.timed(turn_page, page, profile):
+                break
+            page_num += 1
+        except Exception as e:
+            print(f"翻页异常: {e}")
+            break
+
+
+def open_and_filter(page, screenshot_dir, profile):
+    """打开查询页面并筛选广东省."""
+    print(f"打开网址: {SEARCH_URL}")
+
+    try:
+        page.goto(SEARCH_URL, timeout=60000, wait_until="domcontentloaded")
+        if not profile["event_waits"]:
             page.wait_for_load_state("networkidle", timeout=10000)
+    except Exception as e:
+        print(f"页面加载警告: {e}")
+
+    # --- 筛选广东省 ---
+    print("准备筛选 '广东省'...")
+    if profile["event_waits"]:
+        try:
+            page.locator(GD_SELECTOR).first.wait_for(timeout=30000)
         except Exception as e:
-            print(f"页面加载警告: {e}")
+            print(f"等待'广东'按钮超时: {e}")
+    else:
+        time.sleep(5)
+
+    try:
+        gd_btn = page.locator(GD_SELECTOR).first
+        if gd_btn.count() == 0:
+            print("未自动找到'广东'按钮，请手动点击！")
+            page.screenshot(path=f"{screenshot_dir}/before_filter.png")
+        else:
+            print("点击 '广东'...")
+            print("等待数据刷新...")
+            act_and_wait(page, gd_btn.click, profile)
+
+    except Exception as e:
+        print(f"筛选操作异常: {e}")
+        time.sleep(10)
+
+    page.screenshot(path=f"{screenshot_dir}/after_filter.png")
+
 
-        # --- 筛选广东省 ---
-        print("准备筛选 '广东省'...")
+def read_rows(page):
+    """一次 DOM 查询取出本页所有带详情按钮的行的单元格文本."""
+    return page.eval_on_selector_all("tr", ROWS_JS)
+
+
+def process_page(page, context, sink, screenshot_dir, page_num, profile):
+    """处理当前列表页的所有行,本页没有数据行时返回 False."""
+    print(f"\n>>> 正在处理第 {page_num} 页 <<<")
+
+    try:
+        page.wait_for_selector("tr", timeout=10000)
+    except:
+        print("等待表格超时。")
+
+    # 过滤出有效的数据行 (带详情按钮的)
+    data_rows = read_rows(page)
+
+    print(f"本页发现 {len(data_rows)} 条数据行。")
+
+    if len(data_rows) == 0:
+        print("未发现数据行，可能是网络延迟或已无数据。")
+        page.screenshot(path=f"{screenshot_dir}/no_data_page_{page_num}.png")
         time.sleep(5)
+        # Retry
+        data_rows = read_rows(page)
+        if len(data_rows) == 0:
+            return False
 
+    for i, data_row in enumerate(data_rows):
         try:
-            gd_btn = page.locator("a:has-text('广东'), span:has-text('广东'), div:has-text('广东')").first
-            if gd_btn.count() == 0:
-                print("未自动找到'广东'按钮，请手动点击！")
-                page.screenshot(path=f"{screenshot_dir}/before_filter.png")
+            # --- 1. 在列表页提取基础信息 ---
+            cells = data_row["cells"]
+
+            # 默认值
+            p_name = "未获取"
+            ent_name = "未获取"
+            reg_no = "未获取"
+            status = "未获取"
+
+            if len(cells) >= 5:
+                # 根据之前的经验/假设
+                # 0: 序号, 1: 产品名称, 2: 注册人, 3: 注册证号, 4: 状态, 5: 详情
+                p_name = cells[1]
+                ent_name = cells[2]
+                reg_no = cells[3]
+                status = cells[4]
             else:
-                print("点击 '广东'...")
-                gd_btn.click()
-                print("等待数据刷新...")
-                time.sleep(5)
+                # Fallback: 尝试直接获取文本
+                full_text = data_row["text"]
+                print(f"  行结构异常: {full_text[:30]}...")
+                # 仍尝试继续，看状态是否在文本中
+                status = full_text
 
-        except Exception as e:
-            print(f"筛选操作异常: {e}")
-            time.sleep(10)
+            # --- 2. 过滤非当前批件 ---
+            if "当前批件" not in status:
+                print(f"  跳过: {p_name} ({status}) - 非当前批件")
+                continue
 
-        page.screenshot(path=f"{screenshot_dir}/after_filter.png")
+            print(f"  处理: {p_name} | {status}")
 
-        # --- 开始循环处理 ---
-        page_num = 1
+            # 只在需要点击详情时才定位这一行
+            row = page.locator("tr:has-text('详情')").nth(i)
 
-        while True:
-            print(f"\n>>> 正在处理第 {page_num} 页 <<<")
+            # --- 3. 进入详情页获取PDF ---
+            detail_btn = row.locator("text=详情").first
 
+            formula_text = "无查看按钮"
+
+            with context.expect_page(timeout=30000) as detail_page_info:
+                detail_btn.click()
+
+            detail_page = detail_page_info.value
+            detail_page.wait_for_load_state("domcontentloaded")
+
+            # 用户提示详情页有约3秒加载时间，增加等待逻辑
+            print("    进入详情页，等待数据加载...")
             try:
-                page.wait_for_selector("tr", timeout=10000)
+                # 显式等待包含目标文本的行出现
+                detail_page.wait_for_selector("tr:has-text('产品执行的标准'), tr:has-text('技术要求')", timeout=10000)
             except:
-                print("等待表格超时。")
-
-            # 获取所有行
-            rows = page.locator("tr").all()
-
-            # 过滤出有效的数据行 (带详情按钮的)
-            data_rows = []
-            for r in rows:
-                if r.locator("text=详情").count() > 0:
-                    data_rows.append(r)
-
-            print(f"本页发现 {len(data_rows)} 条数据行。")
-
-            if len(data_rows) == 0:
-                print("未发现数据行，可能是网络延迟或已无数据。")
-                page.screenshot(path=f"{screenshot_dir}/no_data_page_{page_num}.png")
-                time.sleep(5)
-                # Retry
-                rows = page.locator("tr").all()
-                data_rows = [r for r in rows if r.locator("text=详情").count() > 0]
-                if len(data_rows) == 0:
-                    break
-
-            for i in range(len(data_rows)):
-                try:
-                    # 重新定位
-                    current_rows = page.locator("tr:has-text('详情')").all()
-                    if i >= len(current_rows):
-                        break
-
-                    row = current_rows[i]
-
-                    # --- 1. 在列表页提取基础信息 ---
-                    cells = row.locator("td").all()
-
-                    # 默认值
-                    p_name = "未获取"
-                    ent_name = "未获取"
-                    reg_no = "未获取"
-                    status = "未获取"
-
-                    if len(cells) >= 5:
-                        # 根据之前的经验/假设
-                        # 0: 序号, 1: 产品名称, 2: 注册人, 3: 注册证号, 4: 状态, 5: 详情
-                        p_name = cells[1].inner_text().strip()
-                        ent_name = cells[2].inner_text().strip()
-                        reg_no = cells[3].inner_text().strip()
-                        status = cells[4].inner_text().strip()
+                print("    等待标准行超时，尝试直接查找...")
+
+            if not profile["event_waits"]:
+                time.sleep(2) # 额外缓冲
+
+            try:
+                # 寻找“产品执行的标准”或“技术要求”所在的行
+                std_row = detail_page.locator("tr").filter(has_text="产品执行的标准").or_(detail_page.locator("tr").filter(has_text="技术要求")).first
+
+                if std_row.count() > 0:
+                    # 查找该行内的“查看”按钮 (可能是 span, a, 或 button)
+                    view_btn = std_row.locator("text=查看").first
+
+                    if view_btn.count() > 0 and view_btn.is_visible():
+                        print("    点击查看标准...")
+
+                        with context.expect_page(timeout=20000) as pdf_page_info:
+                            view_btn.click()
+
+                        pdf_page = pdf_page_info.value
+                        pdf_page.wait_for_load_state("domcontentloaded")
+                        if not profile["event_waits"]:
+                            time.sleep(3) # 等待PDF查看器或内容加载
+
+                        pdf_url = pdf_page.url
+                        print(f"    PDF/内容页链接: {pdf_url}")
+
+                        formula_text = pdf_url
+                        if "url=" in pdf_url:
+                            try:
+                                import urllib.parse
+                                raw_url = pdf_url.split("url=")[1].split("&")[0]
+                                decoded_url = urllib.parse.unquote(raw_url)
+                                formula_text = f"{decoded_url}"
+                            except:
+                                pass
+
+                        pdf_page.close()
                     else:
-                        # Fallback: 尝试直接获取文本
-                        full_text = row.inner_text()
-                        print(f"  行结构异常: {full_text[:30]}...")
-                        # 仍尝试继续，看状态是否在文本中
-                        status = full_text
-
-                    # --- 2. 过滤非当前批件 ---
-                    if "当前批件" not in status:
-                        print(f"  跳过: {p_name} ({status}) - 非当前批件")
-                        continue
-
-                    print(f"  处理: {p_name} | {status}")
-
-                    # --- 3. 进入详情页获取PDF ---
-                    detail_btn = row.locator("text=详情").first
-
-                    formula_text = "无查看按钮"
-
-                    with context.expect_page(timeout=30000) as detail_page_info:
-                        detail_btn.click()
-
-                    detail_page = detail_page_info.value
-                    detail_page.wait_for_load_state("domcontentloaded")
-
-                    # 用户提示详情页有约3秒加载时间，增加等待逻辑
-                    print("    进入详情页，等待数据加载...")
-                    try:
-                        # 显式等待包含目标文本的行出现
-                        detail_page.wait_for_selector("tr:has-text('产品执行的标准'), tr:has-text('技术要求')", timeout=10000)
-                    except:
-                        print("    等待标准行超时，尝试直接查找...")
-
-                    time.sleep(2) # 额外缓冲
-
-                    try:
-                        # 寻找“产品执行的标准”或“技术要求”所在的行
-                        std_row = detail_page.locator("tr").filter(has_text="产品执行的标准").or_(detail_page.locator("tr").filter(has_text="技术要求")).first
-
-                        if std_row.count() > 0:
-                            # 查找该行内的“查看”按钮 (可能是 span, a, 或 button)
-                            view_btn = std_row.locator("text=查看").first
-
-                            if view_btn.count() > 0 and view_btn.is_visible():
-                                print("    点击查看标准...")
-
-                                with context.expect_page(timeout=20000) as pdf_page_info:
-                                    view_btn.click()
-
-                                pdf_page = pdf_page_info.value
-                                pdf_page.wait_for_load_state("domcontentloaded")
-                                time.sleep(3) # 等待PDF查看器或内容加载
-
-                                pdf_url = pdf_page.url
-                                print(f"    PDF/内容页链接: {pdf_url}")
-
-                                formula_text = pdf_url
-                                if "url=" in pdf_url:
-                                    try:
-                                        import urllib.parse
-                                        raw_url = pdf_url.split("url=")[1].split("&")[0]
-                                        decoded_url = urllib.parse.unquote(raw_url)
-                                        formula_text = f"{decoded_url}"
-                                    except:
-                                        pass
-
-                                pdf_page.close()
-                            else:
-                                print("    该行未找到可见的'查看'按钮")
-                        else:
-                            print("    页面中未找到'产品执行的标准'或'技术要求'行")
-                            # 截图以供调试
-                            detail_page.screenshot(path=f"{screenshot_dir}/detail_missing_std_{int(time.time())}.png")
-
-                    except Exception as e:
-                        print(f"    提取标准失败: {e}")
-                        formula_text = f"提取错误: {e}"
-
-                    # 保存数据
-                    new_row = {
-                        "产品名称": p_name,
-                        "企业名称": ent_name,
-                        "注册证号": reg_no,
-                        "批件状态": status,
-                        "产品执行标准全文": formula_text
-                    }
-
-                    df = pd.DataFrame([new_row])
-                    df.to_csv(output_file, mode='a', header=False, index=False, encoding='utf-8-sig')
+                        print("    该行未找到可见的'查看'按钮")
+                else:
+                    print("    页面中未找到'产品执行的标准'或'技术要求'行")
+                    # 截图以供调试
+                    detail_page.screenshot(path=f"{screenshot_dir}/detail_missing_std_{int(time.time())}.png")
 
-                    detail_page.close()
+            except Exception as e:
+                print(f"    提取标准失败: {e}")
+                formula_text = f"提取错误: {e}"
+
+            # 保存数据
+            new_row = {
+                "产品名称": p_name,
+                "企业名称": ent_name,
+                "注册证号": reg_no,
+                "批件状态": status,
+                "产品执行标准全文": formula_text
+            }
+
+            sink.write(new_row)
 
-                except Exception as e:
-                    print(f"行处理错误: {e}")
-                    try:
-                        if 'detail_page' in locals() and not detail_page.is_closed():
-                            detail_page.close()
-                    except:
-                        pass
+            detail_page.close()
 
-            # 翻页
-            print("尝试翻页...")
+        except Exception as e:
+            print(f"行处理错误: {e}")
             try:
-                next_btn = page.locator("button.btn-next, a:has-text('下一页'), li.next").first
+                if 'detail_page' in locals() and not detail_page.is_closed():
+                    detail_page.close()
+            except:
+                pass
+
+    return True
+
+
+def find_next_button(page):
+    """找到下一页按钮,已经是最后一页或找不到翻页控件时返回 None."""
+    next_btn = page.locator("button.btn-next, a:has-text('下一页'), li.next").first
+
+    if next_btn.count() > 0:
+        if next_btn.get_attribute("disabled") or "disabled" in (next_btn.get_attribute("class") or ""):
+            print("已是最后一页。")
+            return None
+        return next_btn
+
+    current_page_num_el = page.locator("ul.el-pager li.active").first
+    if current_page_num_el.count() > 0:
+        curr_num = int(current_page_num_el.inner_text())
+        next_num_el = page.locator(f"ul.el-pager li:has-text('{curr_num + 1}')").first
+        if next_num_el.count() > 0:
+            return next_num_el
+        print("未找到下一页页码，结束。")
+        return None
+
+    print("未找到翻页控件，结束。")
+    return None
+
+
+def turn_page(page, profile):
+    """翻到下一页并等待数据刷新,已经是最后一页或找不到翻页控件时返回 False."""
+    next_btn = find_next_button(page)
+    if next_btn is None:
+        return False
+    act_and_wait(page, next_btn.click, profile)
+    return True
+
+
+def count_pages(page):
+    """从分页控件读出总页数,读不到时返回 0."""
+    numbers = page.eval_on_selector_all(
+        "ul.el-pager li", "lis => lis.map(li => parseInt(li.innerText)).filter(n => !isNaN(n))")
+    return max(numbers) if numbers else 0
+
+
+def goto_page(page, page_num, profile):
+    """跳到第 page_num 页,有跳转输入框时直接输入页码,否则逐页点击下一页."""
+    jumper = page.locator(".el-pagination__jump input").first
+    if jumper.count() > 0:
+        jumper.fill(str(page_num))
+        act_and_wait(page, lambda: jumper.press("Enter"), profile)
+        return True
+    for _ in range(page_num - 1):
+        if not turn_page(page, profile):
+            return False
+    return True
+
+
+def split_pages(total_pages, workers):
+    """把 1..total_pages 分成 workers 段连续的页码范围."""
+    size, extra = divmod(total_pages, workers)
+    ranges = []
+    start = 1
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0) - 1
+        if end >= start:
+            ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+def run_shard(start_page, end_page, shard_file, screenshot_dir, profile_name):
+    """在单独的进程里用无界面浏览器抓取第 start_page 到 end_page 页,结果写到 shard_file."""
+    profile = PROFILES[profile_name]
+    with sync_playwright() as p, RowSink(shard_file) as sink:
+        browser = launch(p, profile, headless=True)
+        context = new_context(browser, profile)
+        page = context.new_page()
+        open_and_filter(page, screenshot_dir, profile)
+        if start_page > 1 and not goto_page(page, start_page, profile):
+            print(f"无法跳转到第 {start_page} 页,放弃第 {start_page}-{end_page} 页。")
+            browser.close()
+            return
+        for page_num in range(start_page, end_page + 1):
+            if not process_page(page, context, sink, screenshot_dir, page_num, profile):
+                break
+            if page_num < end_page and not turn_page(page, profile):
+                break
+        browser.close()
 
-                if next_btn.count() > 0:
-                    if next_btn.get_attribute("disabled") or "disabled" in next_btn.get_attribute("class"):
-                        print("已是最后一页。")
-                        break
 
-                    next_btn.click()
-                    time.sleep(5)
+def run_parallel(workers, output_file, screenshot_dir, profile_name, sink):
+    """先读出总页数,再把页码范围分给 workers 个进程,最后按页码顺序合并到 sink."""
+    profile = PROFILES[profile_name]
+    print("启动浏览器读取总页数...")
+    with sync_playwright() as p:
+        browser = launch(p, profile, headless=True)
+        page = new_context(browser, profile).new_page()
+        open_and_filter(page, screenshot_dir, profile)
+        total_pages = count_pages(page)
+        browser.close()
+
+    if total_pages == 0:
+        print("未读取到总页数,改为单进程一直翻到最后一页。")
+        ranges = [(1, 10 ** 6)]
+    else:
+        ranges = split_pages(total_pages, workers)
+        print(f"共 {total_pages} 页,分给 {len(ranges)} 个进程: {ranges}")
+
+    shard_files = [f"{output_file}.part{i}" for i in range(len(ranges))]
+    for shard_file in shard_files:
+        if os.path.exists(shard_file):
+            os.remove(shard_file)
+    args = [(start, end, shard_file, screenshot_dir, profile_name)
+            for (start, end), shard_file in zip(ranges, shard_files)]
+    with multiprocessing.Pool(len(args)) as pool:
+        pool.starmap(run_shard, args)
+    merge_shards(sink, shard_files)
+
+
+def merge_shards(sink, shard_files):
+    """按顺序把各进程的结果写入 sink(会按注册证号去重),合并后删除分片文件."""
+    for shard_file in shard_files:
+        if not os.path.exists(shard_file):
+            continue
+        for row in read_csv_rows(shard_file):
+            sink.write(row)
+        os.remove(shard_file)
+
+
+def run_capture(page, context, sink, screenshot_dir, profile, stats=None):
+    """照常筛选和翻页,用页面自己发出的 XHR 响应代替逐行打开详情页和 PDF 查看器.
+
+    表格的各列从页面上读.列表接口和详情接口都是按记下的响应认出来的(见
+    nmpa_capture);第一次点开详情时记下详情请求,之后换成各条记录的 id 重放.
+    页面发出的请求里找不到表格里的数据时抛出 nmpa_capture.CaptureError.
+    """
+    stats = stats or LoadStats()
+    recorder = nmpa_capture.ResponseRecorder()
+    # 注册在 context 上,详情页发出的请求也能记下
+    context.on("response", recorder.on_response)
+    stats.timed(open_and_filter, page, screenshot_dir, profile)
+
+    template = None
+    page_num = 1
+
+    while True:
+        data_rows = read_rows(page)
+        print(f"\n>>> 第 {page_num} 页发现 {len(data_rows)} 条数据行 <<<")
+        if len(data_rows) == 0:
+            page.screenshot(path=f"{screenshot_dir}/capture_no_data_page_{page_num}.png")
+            break
+        records = nmpa_capture.match_records(
+            recorder.take(), [row["cells"][3] for row in data_rows if len(row["cells"]) >= 5])
+
+        for i, data_row in enumerate(data_rows):
+            cells = data_row["cells"]
+            if len(cells) < 5:
+                print(f"  行结构异常: {data_row['text'][:30]}...")
+                continue
+            p_name, ent_name, reg_no, status = cells[1:5]
+            if "当前批件" not in status:
+                print(f"  跳过: {p_name} ({status}) - 非当前批件")
+                continue
+
+            record = records.get(reg_no)
+            formula_text = "未找到标准文件"
+            try:
+                if template is None:
+                    pdf_url, template = capture_detail(page, context, recorder, i, record)
+                elif record is not None:
+                    pdf_url = replay_detail(context, template, record)
                 else:
-                    current_page_num_el = page.locator("ul.el-pager li.active").first
-                    if current_page_num_el.count() > 0:
-                        curr_num = int(current_page_num_el.inner_text())
-                        next_num_el = page.locator(f"ul.el-pager li:has-text('{curr_num + 1}')").first
-                        if next_num_el.count() > 0:
-                            next_num_el.click()
-                            time.sleep(5)
-                            page_num += 1
-                        else:
-                            print("未找到下一页页码，结束。")
-                            break
-                    else:
-                        print("未找到翻页控件，结束。")
-                        break
+                    pdf_url = capture_detail(page, context, recorder, i, record)[0]
+                formula_text = pdf_url or formula_text
             except Exception as e:
-                print(f"翻页异常: {e}")
+                formula_text = f"提取错误: {e}"
+            print(f"  处理: {p_name} | {formula_text}")
+
+            new_row = {
+                "产品名称": p_name,
+                "企业名称": ent_name,
+                "注册证号": reg_no,
+                "批件状态": status,
+                "产品执行标准全文": formula_text
+            }
+            sink.write(new_row)
+        stats.sample(sink)
+
+        try:
+            if not stats.timed(turn_page, page, profile):
                 break
+            page_num += 1
+        except Exception as e:
+            print(f"翻页异常: {e}")
+            break
+
+
+def capture_detail(page, context, recorder, index, record):
+    """点开第 index 行的详情,从详情页发出的 XHR 响应里找标准 PDF 地址,不打开 PDF 查看器.
+
+    返回 (PDF 地址, 重放详情请求的模板),见 nmpa_capture.find_detail.
+    """
+    recorder.take()
+    with context.expect_page(timeout=30000) as detail_page_info:
+        page.locator("tr:has-text('详情')").nth(index).locator("text=详情").first.click()
+    detail_page = detail_page_info.value
+    try:
+        detail_page.wait_for_selector("tr:has-text('产品执行的标准'), tr:has-text('技术要求')", timeout=10000)
+    except Exception:
+        print("    等待标准行超时")
+    try:
+        # 详情页关闭后就读不到响应的内容了,先找完再关
+        pdf_url, template = nmpa_capture.find_detail(recorder.take(), record)
+    finally:
+        detail_page.close()
+    if template is not None:
+        print(f"    详情接口: {template['method']} {template['url']},记录 id 字段: {template['id_key']}")
+    return pdf_url, template
+
+
+def replay_detail(context, template, record):
+    """用 capture_detail 记下的详情请求换成 record 的 id 重放,返回标准 PDF 地址."""
+    request = nmpa_capture.replay_request(template, record)
+    if request is None:
+        return ""
+    response = context.request.fetch(request["url"], method=request["method"],
+                                     headers=request["headers"], data=request["data"])
+    return nmpa_capture.find_pdf_url(nmpa_capture.read_json(response))
 
-        print(f"任务完成。文件已保存至 {output_file}")
-        browser.close()
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="抓取广东省化妆品注册信息")
+    parser.add_argument("--mode", choices=["ui", "capture"], default="ui",
+                        help="ui: 逐行点击详情页; capture: 从网页发出的接口请求里取标准地址,不打开 PDF 查看器")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="ui 模式下同时抓取的无界面浏览器进程数,默认 1 (有界面单进程);"
+                             "大于 1 时不能和 --measure, --metrics, --cprofile 一起使用")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="default",
+                        help="浏览器启动配置,fast: 无界面,拦截图片/字体/样式和第三方请求,按事件等待")
+    parser.add_argument("--measure", action="store_true",
+                        help="统计页面加载耗时和下载量,用来比较不同的启动配置")
+    parser.add_argument("--sqlite", action="store_true", help="同时把结果写入同名的 SQLite 数据库")
+    parser.add_argument("--parquet", action="store_true", help="结束时另外导出一份 Parquet 文件(需要 pyarrow)")
+    parser.add_argument("--metrics", help="每处理完一页把性能统计写到这个文件,以 .prom 结尾时为 Prometheus 文本格式,否则为 JSON")
+    parser.add_argument("--cprofile", help="用 cProfile 分析整个运行过程,把结果保存到这个文件")
+    args = parser.parse_args()
+    if args.workers > 1:
+        # 多进程时各个浏览器进程的统计没有汇总,不支持这些选项
+        if args.mode != "ui":
+            parser.error("--workers 只能用于 ui 模式")
+        unsupported = [name for name, value in (("--measure", args.measure), ("--metrics", args.metrics),
+                                                ("--cprofile", args.cprofile)) if value]
+        if unsupported:
+            parser.error("--workers 大于 1 时不支持 {}".format(", ".join(unsupported)))
+    run_args = (args.mode, args.workers, args.profile, args.measure, args.sqlite, args.parquet, args.metrics)
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        profiler.runcall(run, *run_args)
+        profiler.dump_stats(args.cprofile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    else:
+        run(*run_args)
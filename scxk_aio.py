@@ -0,0 +1,247 @@
+"""scxk.nmpa 接口的异步客户端.
+
+基于 aiohttp,所有请求都在同一个事件循环里发出,共用一个连接池和一个信号量.一个
+进程里可以同时挂起上千个列表页/详情页请求,每个在途请求只是一个协程,不需要占用
+一个线程.所有请求经过同一个限速器,失败时按指数退避重试,可以启用响应缓存,并记录
+性能统计.这是唯一发请求的客户端,地址和请求头等常量在 scxk_client.py 里.
+
+同步代码通过 run() 把协程交给后台线程里的事件循环执行并等待结果,
+scxk_nmpa_final.py 和 scxk_refactor.py 里原来的同步函数都是这里的薄包装.
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+
+import aiohttp
+
+from scxk_cache import CACHE_FILE, ResponseCache
+from scxk_client import (CACHE_ENV, DETAIL_URL, ENDPOINTS, LIST_URL, OFFLINE_ENV, POOL_SIZE, RETRIES,
+                         headers, list_form)
+from scxk_limiter import RateLimiter, backoff_delay
+from scxk_metrics import get_metrics
+from scxk_record import compact
+
+# 同时挂起的请求协程数上限,真正同时发出的请求数还受限速器的并发上限控制
+CONCURRENCY = 1000
+# 单个请求的超时时间(秒)
+TIMEOUT = 60
+
+
+class AsyncScxkClient:
+    """异步的 scxk 客户端,只能在同一个事件循环里使用."""
+
+    def __init__(self, pool_size: int = POOL_SIZE, limiter: RateLimiter = None, retries: int = RETRIES,
+                 cache: ResponseCache = None, concurrency: int = CONCURRENCY):
+        self.limiter = limiter or RateLimiter()
+        self.retries = retries
+        self.cache = cache
+        self.pool_size = pool_size
+        self.concurrency = concurrency
+        self.retry_count = 0
+        self.request_count = 0
+        self.connection_count = 0
+        self.reused_count = 0
+        self.session = None
+        self.semaphore = None
+
+    def _open(self) -> aiohttp.ClientSession:
+        # 连接池和信号量要在事件循环里创建
+        if self.session is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            # 统计新建的连接数和复用连接的请求数,看 keep-alive 是否生效
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._on_connection_create)
+            trace.on_connection_reuseconn.append(self._on_connection_reuse)
+            self.session = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=TIMEOUT),
+                trace_configs=[trace],
+            )
+        return self.session
+
+    async def _on_connection_create(self, session, context, params) -> None:
+        self.connection_count += 1
+
+    async def _on_connection_reuse(self, session, context, params) -> None:
+        self.reused_count += 1
+
+    async def _send(self, url: str, form: dict, headers: dict, endpoint: str) -> dict:
+        """经过限速器发出一次请求并解析 JSON,不重试.不管结果如何都会归还限速器的名额."""
+        metrics = get_metrics()
+        with metrics.timer("limiter_wait_seconds", endpoint=endpoint):
+            await self.limiter.acquire()
+        start = time.time()
+        ok = None
+        throttled = False
+        status = "error"
+        try:
+            async with self._open().post(url, data=form, headers=headers) as response:
+                body = await response.read()
+                self.request_count += 1
+                status = str(response.status)
+                metrics.observe("request_seconds", time.time() - start, endpoint=endpoint)
+                metrics.inc("response_bytes_total", len(body), endpoint=endpoint)
+                throttled = response.status == 429 or response.status >= 500
+                response.raise_for_status()
+            with metrics.timer("parse_seconds", endpoint=endpoint):
+                result = json.loads(body)
+            ok = True
+            return result
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            ok = False
+            raise
+        finally:
+            # 被取消或者出了其他异常时 ok 为 None,只归还名额,不当成服务器出错
+            self.limiter.release(None if ok is None else time.time() - start, ok=bool(ok), throttled=throttled)
+            metrics.inc("requests_total", endpoint=endpoint, status=status)
+
+    async def post_json(self, url: str, data: dict, headers: dict = None) -> dict:
+        """先查缓存,经过限速器发出请求,失败时按指数退避重试,重试用完后抛出异常."""
+        metrics = get_metrics()
+        endpoint = ENDPOINTS.get(url, "other")
+        if self.cache is not None:
+            # SQLite 的读写放到线程池里,不阻塞事件循环里的其他请求
+            result = await asyncio.to_thread(self.cache.get, url, data, endpoint)
+            if result is not None:
+                metrics.inc("cache_hits_total", endpoint=endpoint)
+                return result
+            metrics.inc("cache_misses_total", endpoint=endpoint)
+        self._open()
+        form = {key: str(value) for key, value in data.items()}
+        async with self.semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    result = await self._send(url, form, headers, endpoint)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    if attempt == self.retries:
+                        raise
+                    self.retry_count += 1
+                    metrics.inc("retries_total", endpoint=endpoint)
+                    # 429/5xx 时服务器可能在 Retry-After 里给出等待时间
+                    retry_after = float((getattr(e, "headers", None) or {}).get("Retry-After", 0) or 0)
+                    delay = max(retry_after, backoff_delay(attempt))
+                    print("请求失败: {},{:.1f}s 后第 {} 次重试".format(e or type(e).__name__, delay, attempt + 1))
+                    await asyncio.sleep(delay)
+                else:
+                    if self.cache is not None:
+                        await asyncio.to_thread(self.cache.put, url, data, result, endpoint)
+                    return result
+
+    async def get_list(self, kw, page) -> dict:
+        """请求关键字 kw 第 page 页的列表数据."""
+        return await self.post_json(LIST_URL, dict(list_form, page=page, productName=kw))
+
+    async def get_detail(self, id: str, headers: dict = None) -> dict:
+        """请求 id 对应的详情页数据."""
+        return await self.post_json(DETAIL_URL, {"id": id}, headers=headers)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.request_count,
+            "connections": self.connection_count,
+            "reused": self.reused_count,
+            "retries": self.retry_count,
+            "limiter": self.limiter.stats(),
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.cache is not None:
+            self.cache.close()
+
+
+_client = None
+_loop = None
+_lock = threading.Lock()
+
+
+def get_client() -> AsyncScxkClient:
+    """返回进程内共用的异步客户端,第一次调用时创建,设置了环境变量 SCXK_CACHE 或 SCXK_OFFLINE 时启用响应缓存."""
+    global _client
+    with _lock:
+        if _client is None:
+            cache = None
+            if os.environ.get(CACHE_ENV) or os.environ.get(OFFLINE_ENV):
+                cache = ResponseCache(os.environ.get(CACHE_ENV) or CACHE_FILE,
+                                      offline=os.environ.get(OFFLINE_ENV) == "1")
+            _client = AsyncScxkClient(cache=cache)
+    return _client
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """后台线程里一直运行的事件循环,第一次调用时启动."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+            atexit.register(_shutdown)
+    return _loop
+
+
+def _shutdown() -> None:
+    if _client is not None and _client.session is not None:
+        asyncio.run_coroutine_threadsafe(_client.close(), _loop).result(timeout=10)
+    _loop.call_soon_threadsafe(_loop.stop)
+
+
+def run(coro):
+    """在后台事件循环里执行协程并等待结果,给同步代码调用,可以在多个线程里同时调用."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+async def get_list(kw, page) -> dict:
+    return await get_client().get_list(kw, page)
+
+
+async def get_pages_status(kw) -> dict:
+    """第一页的数据: 分页总数,数据总条数,第一页的 id 和每个 id 的有效期(XK_DATE)."""
+    result = await get_client().get_list(kw, 1)
+    return {
+        "page_count": result["pageCount"],
+        "total_count": result["totalCount"],
+        "ids": [i["ID"] for i in result["list"]],
+        "xk_dates": {i["ID"]: i.get("XK_DATE") for i in result["list"]},
+    }
+
+
+async def get_pages(page, kw, start: int = 1, xk_dates: dict = None) -> list:
+    """同时请求第 start 页到第 page 页,按页码顺序返回所有 id.
+
+    传入 xk_dates 时,列表页里每个 id 的有效期(XK_DATE)也会记到 xk_dates 里.
+    """
+    client = get_client()
+    results = await asyncio.gather(*(client.get_list(kw, i) for i in range(start, page + 1)))
+    id_list = list()
+    for result in results:
+        id_list.extend(i["ID"] for i in result["list"])
+        if xk_dates is not None:
+            xk_dates.update((i["ID"], i.get("XK_DATE")) for i in result["list"])
+    return id_list
+
+
+async def get_detail(id: str, headers: dict = None) -> dict:
+    return await get_client().get_detail(id, headers=headers)
+
+
+async def fetch_details(ids: list) -> list:
+    """同时请求 ids 的详情,返回结果的顺序与 ids 一致,每条详情是一个 PermitRecord."""
+    client = get_client()
+    return [compact(detail) for detail in await asyncio.gather(*(client.get_detail(id) for id in ids))]
+
+
+def print_stats(client: AsyncScxkClient = None) -> None:
+    stats = (client or get_client()).stats()
+    print("请求数 {},新建连接数 {},复用连接的请求数 {},重试次数 {}".format(
+        stats["requests"], stats["connections"], stats["reused"], stats["retries"]))
+    print("限速器状态: {}".format(stats["limiter"]))
+    if stats["cache"] is not None:
+        print("响应缓存: {}".format(stats["cache"]))
@@ -0,0 +1,131 @@
+"""用本地模拟服务器测量爬虫的性能.
+
+启动 scxk_mock_server 的模拟接口,在单独的子进程里分别运行 scxk_nmpa_final.py
+和 scxk_refactor.py 的完整抓取流程,每次都在新的临时目录里运行(不会读取之前的
+日志和结果),最后输出每种抓取方式的请求数,每秒请求数,总耗时和内存峰值.
+
+    python scxk_bench.py --latency 0.02 --rate 200
+    python scxk_bench.py --strategy final --error-rate 0.05 --rate-limit 100
+"""
+
+import argparse
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+
+import scxk_mock_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STRATEGIES = {
+    "final": ("scxk_nmpa_final.py", "results.json"),
+    "refactor": ("scxk_refactor.py", "items.json"),
+}
+# 子进程里限速器每秒的请求数;真实网站的默认值太慢,测量时放宽
+RATE = 200.0
+
+
+def peak_rss() -> int:
+    """当前进程的内存峰值(字节)."""
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位是字节,Linux 是 KB
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_child(strategy: str, result_file: str, rate: float) -> None:
+    """在子进程里运行一种抓取方式,把测量结果写到 result_file."""
+    from scxk_aio import get_client
+    from scxk_limiter import RateLimiter
+    from scxk_sink import read_records
+
+    script, output_file = STRATEGIES[strategy]
+    client = get_client()
+    if rate:
+        client.limiter = RateLimiter(rate=rate, burst=max(1, int(rate)))
+    path = os.path.join(HERE, script)
+    sys.argv = [path]
+    start = time.time()
+    runpy.run_path(path, run_name="__main__")
+    elapsed = time.time() - start
+    stats = client.stats()
+    records = sum(1 for _ in read_records(output_file)) if os.path.exists(output_file) else 0
+    with open(result_file, "w", encoding="utf-8") as fp:
+        json.dump({
+            "elapsed": elapsed,
+            "requests": stats["requests"],
+            "retries": stats["retries"],
+            "records": records,
+            "peak_rss": peak_rss(),
+        }, fp)
+
+
+def bench(strategy: str, mock: scxk_mock_server.MockScxk, url: str, rate: float, verbose: bool = False) -> dict:
+    """在临时目录里用子进程运行一种抓取方式,返回测量结果."""
+    with tempfile.TemporaryDirectory() as workdir:
+        result_file = os.path.join(workdir, "bench_result.json")
+        env = dict(os.environ, SCXK_BASE_URL=url)
+        command = [sys.executable, os.path.abspath(__file__), "--child", strategy,
+                   "--result", result_file, "--rate", str(rate)]
+        for key in mock.counts:
+            mock.counts[key] = 0
+        subprocess.run(command, cwd=workdir, env=env, check=True,
+                       stdout=None if verbose else subprocess.DEVNULL)
+        with open(result_file, encoding="utf-8") as fp:
+            result = json.load(fp)
+    result["strategy"] = strategy
+    result["server"] = dict(mock.counts)
+    result["requests_per_sec"] = result["requests"] / result["elapsed"] if result["elapsed"] else 0.0
+    return result
+
+
+def report(results: list) -> None:
+    print("{:<10}{:>10}{:>10}{:>10}{:>10}{:>10}{:>12}".format(
+        "方式", "请求数", "请求/s", "耗时(s)", "重试", "详情数", "内存峰值(MB)"))
+    for r in results:
+        print("{:<10}{:>10}{:>10.1f}{:>10.1f}{:>10}{:>10}{:>12.1f}".format(
+            r["strategy"], r["requests"], r["requests_per_sec"], r["elapsed"], r["retries"],
+            r["records"], r["peak_rss"] / 1024 / 1024))
+        print("{:<10}服务器统计: {}".format("", r["server"]))
+
+
+def main(args) -> None:
+    mock = scxk_mock_server.mock_from_args(args)
+    server = scxk_mock_server.start_server(mock)
+    url = scxk_mock_server.server_url(server)
+    print("模拟服务器 {},共 {} 条数据".format(url, len(mock.records)))
+    results = []
+    try:
+        for strategy in args.strategy or list(STRATEGIES):
+            print("正在测量 {} ...".format(strategy))
+            results.append(bench(strategy, mock, url, args.rate, args.verbose))
+    finally:
+        server.shutdown()
+    report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用本地模拟服务器测量爬虫的性能")
+    parser.add_argument("--strategy", action="append", choices=list(STRATEGIES),
+                        help="要测量的抓取方式,可以重复指定,默认全部")
+    parser.add_argument("--rate", type=float, default=RATE, help="限速器每秒的请求数,0 表示使用客户端的默认值")
+    parser.add_argument("--output", help="把测量结果另存为 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="显示爬虫自己的输出")
+    parser.add_argument("--child", choices=list(STRATEGIES), help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    scxk_mock_server.add_mock_arguments(parser)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child, args.result, args.rate)
+    else:
+        main(args)
@@ -0,0 +1,129 @@
+"""接口响应的本地缓存.
+
+用 SQLite 保存接口返回的 JSON,以请求地址加整理过的表单数据作为键.列表接口和
+详情接口分别设置有效期,缓存总大小超过上限时删掉最久没有用过的记录.离线模式下
+不发请求,只从缓存读取(不管是否过期),缓存里没有时抛出 CacheMiss.重复运行和只做
+查询规划时基本不用再请求服务器.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+CACHE_FILE = "response_cache.db"
+# 各接口缓存的有效期(秒),None 表示永不过期
+TTLS = {
+    "list": 24 * 3600,
+    "detail": 7 * 24 * 3600,
+}
+DEFAULT_TTL = 3600
+# 缓存的总大小上限(字节)
+MAX_BYTES = 512 * 1024 * 1024
+
+
+class CacheMiss(Exception):
+    """离线模式下缓存里没有这个请求的响应."""
+
+
+def cache_key(url: str, data: dict) -> str:
+    """请求地址和表单数据的键,表单按字段名排序,值统一转成字符串."""
+    form = urllib.parse.urlencode(sorted((str(k), str(v)) for k, v in (data or {}).items()))
+    return hashlib.sha256((url + "\n" + form).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """接口响应缓存,可以在多个线程之间共用."""
+
+    def __init__(self, path: str = CACHE_FILE, ttls: dict = None, max_bytes: int = MAX_BYTES,
+                 offline: bool = False):
+        self.path = path
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                url TEXT NOT NULL,
+                form TEXT NOT NULL,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+        """)
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url: str, data: dict, endpoint: str = "other"):
+        """缓存的响应,没有或已过期时返回 None;离线模式下没有缓存时抛出 CacheMiss."""
+        key = cache_key(url, data)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+            ttl = self.ttls.get(endpoint, DEFAULT_TTL)
+            if row is not None and (self.offline or ttl is None or now - row[1] <= ttl):
+                self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+        if self.offline:
+            raise CacheMiss("离线模式下缓存里没有这个请求: {} {}".format(url, data))
+        return None
+
+    def put(self, url: str, data: dict, result, endpoint: str = "other") -> None:
+        body = json.dumps(result, ensure_ascii=False)
+        size = len(body.encode("utf-8"))
+        key = cache_key(url, data)
+        form = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (key, endpoint, url, form, body, size, now, now))
+            self.total_bytes += size - (row[0] if row else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        """总大小超过上限时,从最久没有用过的记录开始删,直到降到上限的九成以下."""
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed")
+        keys = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            keys.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.evicted += len(keys)
+
+    def stats(self) -> dict:
+        with self.lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "entries": count,
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "offline": self.offline,
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,39 @@
+"""解析许可项目(certStr).
+
+certStr 是一串 "单元（类别、类别）" 用分号连起来的文字,例如
+"一般液态单元（啫喱类、护发清洁类）；粉单元（块状粉类、散粉类）".这里把它拆成
+(单元, 类别) 的列表,全角半角括号和分隔符都统一处理,没有类别的单元记为 (单元, "").
+"""
+
+import re
+
+# 单元之间的分隔符
+UNIT_SEPARATORS = re.compile(r"[；;\n]+")
+# 类别之间的分隔符
+CATEGORY_SEPARATORS = re.compile(r"[、，,；;/]+")
+# "单元（类别、类别）",括号可能是全角或半角,也可能没有
+UNIT_PATTERN = re.compile(r"^(?P<unit>[^（(]+?)\s*(?:[（(](?P<categories>.*?)[）)]?)?$")
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", "", text or "").strip("。.")
+
+
+def parse_cert_str(cert_str: str) -> list:
+    """把 certStr 拆成 [(单元, 类别), ...],顺序和原文一致,重复的项只保留一个."""
+    pairs = []
+    seen = set()
+    for part in UNIT_SEPARATORS.split(cert_str or ""):
+        part = normalize(part)
+        if not part:
+            continue
+        match = UNIT_PATTERN.match(part)
+        if match is None:
+            continue
+        unit = match.group("unit")
+        categories = [c for c in CATEGORY_SEPARATORS.split(match.group("categories") or "") if c]
+        for category in categories or [""]:
+            if (unit, category) not in seen:
+                seen.add((unit, category))
+                pairs.append((unit, category))
+    return pairs
@@ -0,0 +1,36 @@
+"""scxk.nmpa 接口的地址,请求头和客户端设置.
+
+真正发请求的客户端在 scxk_aio.py 里,这里只放各个脚本共用的常量.
+"""
+
+import os
+
+# 设置环境变量 SCXK_BASE_URL 可以改为请求其他地址,例如本地的 scxk_mock_server.py
+BASE_URL = os.environ.get("SCXK_BASE_URL", "http://scxk.nmpa.gov.cn:81").rstrip("/")
+LIST_URL = BASE_URL + "/xk/itownet/portalAction.do?method=getXkzsList"
+DETAIL_URL = BASE_URL + "/xk/itownet/portalAction.do?method=getXkzsById"
+# 性能统计里区分接口用的名字
+ENDPOINTS = {LIST_URL: "list", DETAIL_URL: "detail"}
+headers = {
+    'Origin':
+        BASE_URL,
+    'Referer':
+        BASE_URL + '/xk/',
+    'User-Agent':
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36',
+}
+# 列表页请求表单里固定不变的字段
+list_form = {
+    'on': 'true',
+    'pageSize': '15',
+    'conditionType': '1',
+    'applyname': '',
+    'applysn': '',
+}
+# 每个主机最多同时保持的连接数,连接用完时请求会等待而不是新建连接
+POOL_SIZE = 16
+# 请求失败(网络错误,429/5xx,返回的不是 JSON)后的最大重试次数
+RETRIES = 5
+# 设置环境变量 SCXK_CACHE 为缓存文件路径时启用响应缓存,SCXK_OFFLINE=1 时只从缓存读取
+CACHE_ENV = "SCXK_CACHE"
+OFFLINE_ENV = "SCXK_OFFLINE"
@@ -0,0 +1,128 @@
+"""比较两次抓取的结果,输出新增,删除和变化的许可证.
+
+两个快照都是逐条读取的: 先读一遍旧快照,只记下每条记录的键(productSn,没有时用 id)
+和内容的哈希;再读新快照,键不在旧快照里的是新增,哈希不一样的是有变化;最后再读
+一遍旧快照,输出被删除的记录和有变化的记录改了哪些字段.内存里只有每条记录的键和
+哈希,以及有变化的新记录,耗时和两个文件的大小成正比.结果每行一个事件(NDJSON):
+
+    {"event": "added", "key": "粤妆20230001", "record": {...}}
+    {"event": "removed", "key": "粤妆20160001", "record": {...}}
+    {"event": "changed", "key": "粤妆20170002", "changes": {"xkDate": ["2022-01-01", "2027-01-01"]}, "tags": ["renewed"]}
+    {"event": "expiring", "key": "粤妆20180003", "xkDate": "2025-03-01", "days": 20}
+
+    python scxk_diff.py results.prev.json results.json -o changes.ndjson --expiring 30
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import time
+
+from scxk_record import PermitRecord
+from scxk_sink import JsonSink, read_records
+
+OUTPUT_FILE = "changes.ndjson"
+# 按顺序取第一个不为空的字段作为记录的键
+KEYS = ("productSn", "id")
+# 这些字段从空变成有值,表示许可证被注销
+REVOKE_FIELDS = ("offDate", "offReason")
+
+
+def content_hash(record: dict) -> bytes:
+    return hashlib.blake2b(json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8"),
+                           digest_size=16).digest()
+
+
+def record_key(record: dict) -> str:
+    """记录的键: productSn 或 id,都为空时用内容的哈希."""
+    for key in KEYS:
+        if record.get(key):
+            return record[key]
+    return content_hash(record).hex()
+
+
+def changed_fields(old: dict, new: dict) -> dict:
+    """两条记录中取值不同的字段: {字段: [旧值, 新值]},字段按名字排序."""
+    return {
+        key: [old.get(key), new.get(key)]
+        for key in sorted(set(old) | set(new)) if old.get(key) != new.get(key)
+    }
+
+
+def change_tags(changes: dict) -> list:
+    """变化的类型: revoked(被注销),renewed(有效期延长),xkDate(有效期有其他变化)."""
+    tags = []
+    if any(key in changes and not changes[key][0] and changes[key][1] for key in REVOKE_FIELDS):
+        tags.append("revoked")
+    if "xkDate" in changes:
+        old, new = changes["xkDate"]
+        tags.append("renewed" if old and new and new > old else "xkDate")
+    return tags
+
+
+def days_until(xk_date: str, today: datetime.date):
+    try:
+        return (datetime.date.fromisoformat(xk_date[:10]) - today).days
+    except (TypeError, ValueError):
+        return None
+
+
+def diff(old_path: str, new_path: str, expiring: int = None, today: datetime.date = None):
+    """逐个产出 old_path 到 new_path 的变化事件.
+
+    expiring 不为空时,新快照里有效期(xkDate)在 today 之后 expiring 天以内的许可证也会
+    产出一个 expiring 事件.
+    """
+    today = today or datetime.date.today()
+    index = {}
+    for record in read_records(old_path):
+        # 同一个键出现多次时只比较第一条
+        index.setdefault(record_key(record), content_hash(record))
+    seen = set()
+    changed = {}
+    for record in read_records(new_path):
+        key = record_key(record)
+        if key in seen:
+            continue
+        seen.add(key)
+        digest = index.get(key)
+        if digest is None:
+            yield {"event": "added", "key": key, "record": record}
+        elif digest != content_hash(record):
+            changed[key] = PermitRecord.from_dict(record)
+        if expiring is not None:
+            days = days_until(record.get("xkDate"), today)
+            if days is not None and 0 <= days <= expiring:
+                yield {"event": "expiring", "key": key, "xkDate": record.get("xkDate"), "days": days}
+    done = set()
+    for record in read_records(old_path):
+        key = record_key(record)
+        if key in done:
+            continue
+        done.add(key)
+        if key not in seen:
+            yield {"event": "removed", "key": key, "record": record}
+        elif key in changed:
+            changes = changed_fields(record, changed.pop(key).to_dict())
+            yield {"event": "changed", "key": key, "changes": changes, "tags": change_tags(changes)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比较两次抓取的结果,输出新增,删除和变化的许可证")
+    parser.add_argument("old", help="旧的结果文件(JSON 数组或 NDJSON)")
+    parser.add_argument("new", help="新的结果文件")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE, help="变化事件的输出文件(NDJSON)")
+    parser.add_argument("--expiring", type=int, metavar="DAYS", help="同时输出新快照里 DAYS 天内到期的许可证")
+    parser.add_argument("--today", type=datetime.date.fromisoformat, help="计算到期天数的日期,默认为今天")
+    args = parser.parse_args()
+
+    start = time.time()
+    counts = {}
+    with JsonSink(args.output, fmt="ndjson") as sink:
+        for event in diff(args.old, args.new, args.expiring, args.today):
+            counts[event["event"]] = counts.get(event["event"], 0) + 1
+            for tag in event.get("tags", ()):
+                counts[tag] = counts.get(tag, 0) + 1
+            sink.write(event)
+    print("{},已保存到 {},耗时 {:.1f}s".format(counts or "没有变化", args.output, time.time() - start))
@@ -0,0 +1,102 @@
+"""抓取进度日志.
+
+用 SQLite 记录已经完成的查询计划,叶子关键字的 id 列表和已经抓取的详情数据.
+每条记录写入后立即提交,程序中途退出也不会丢失已完成的部分,重新运行时直接
+从日志里读取,不再重复请求服务器.
+"""
+
+import json
+import sqlite3
+import threading
+
+JOURNAL_FILE = "crawl_journal.db"
+# 数据库被其他进程锁住时最多等待的秒数,分片抓取时多个进程共用一个日志
+BUSY_TIMEOUT = 60
+
+
+class CrawlJournal:
+    """抓取进度日志,可以在多个线程之间共用."""
+
+    def __init__(self, path: str = JOURNAL_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS plans (
+                kw TEXT PRIMARY KEY,
+                leaves TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leaves (
+                kw TEXT PRIMARY KEY,
+                total_count INTEGER,
+                ids TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS details (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def _get(self, sql: str, args: tuple):
+        with self.lock:
+            return self.conn.execute(sql, args).fetchone()
+
+    def _put(self, sql: str, args: tuple) -> None:
+        with self.lock:
+            self.conn.execute(sql, args)
+            self.conn.commit()
+
+    def get_plan(self, kw: str):
+        """kw 的查询计划(叶子查询列表),没有记录时返回 None."""
+        row = self._get("SELECT leaves FROM plans WHERE kw = ?", (kw,))
+        return json.loads(row[0]) if row else None
+
+    def save_plan(self, kw: str, leaves: list) -> None:
+        self._put("INSERT OR REPLACE INTO plans (kw, leaves) VALUES (?, ?)",
+                  (kw, json.dumps(leaves, ensure_ascii=False)))
+
+    def plan_keywords(self) -> list:
+        """日志里有查询计划的关键字."""
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT kw FROM plans ORDER BY rowid")]
+
+    def get_leaf(self, kw: str):
+        """已完成的叶子关键字 kw 的 id 列表,没有完成时返回 None."""
+        row = self._get("SELECT ids FROM leaves WHERE kw = ?", (kw,))
+        return json.loads(row[0]) if row else None
+
+    def get_leaf_total(self, kw: str):
+        """上次遍历叶子关键字 kw 时服务器返回的数据总条数."""
+        row = self._get("SELECT total_count FROM leaves WHERE kw = ?", (kw,))
+        return row[0] if row else None
+
+    def finish_leaf(self, kw: str, ids: list, total_count: int = None) -> None:
+        self._put("INSERT OR REPLACE INTO leaves (kw, total_count, ids) VALUES (?, ?, ?)",
+                  (kw, total_count, json.dumps(ids)))
+
+    def get_detail(self, id: str):
+        """已抓取的详情数据,没有抓取过时返回 None."""
+        row = self._get("SELECT data FROM details WHERE id = ?", (id,))
+        return json.loads(row[0]) if row else None
+
+    def save_detail(self, id: str, detail: dict) -> None:
+        self._put("INSERT OR REPLACE INTO details (id, data) VALUES (?, ?)",
+                  (id, json.dumps(detail, ensure_ascii=False)))
+
+    def drop_detail(self, id: str) -> None:
+        """删掉已抓取的详情,下次会重新抓取."""
+        self._put("DELETE FROM details WHERE id = ?", (id,))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                table: self.conn.execute("SELECT COUNT(*) FROM " + table).fetchone()[0]
+                for table in ("plans", "leaves", "details")
+            }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
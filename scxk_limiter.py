@@ -0,0 +1,112 @@
+"""请求限速和自适应并发控制.
+
+令牌桶限制每秒请求数,另外限制同时在途的请求数.并发上限按"加性增,乘性减"
+调整: 请求顺利时慢慢放开,响应变慢时收紧一点,遇到 429/5xx 或网络错误时减半,
+同时降低每秒请求数,等服务器恢复后再逐步回升.
+"""
+
+import asyncio
+import random
+import time
+
+# 每秒最多发出的请求数
+RATE = 10.0
+# 令牌桶容量,允许的瞬时突发请求数
+BURST = 10
+# 同时在途请求数的上限
+MAX_IN_FLIGHT = 8
+# 响应时间超过这个秒数就认为服务器开始吃力了
+TARGET_LATENCY = 2.0
+# 重试等待时间的基数和上限(秒)
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+class RateLimiter:
+    """令牌桶限速加自适应并发上限,只能在一个事件循环里使用.
+
+    等待名额的协程在 lock 上排队,只有排在最前面的一个在等空闲名额或令牌,名额空出来时
+    由 release() 唤醒,不需要轮询.
+    """
+
+    def __init__(self, rate: float = RATE, burst: int = BURST, max_in_flight: int = MAX_IN_FLIGHT,
+                 target_latency: float = TARGET_LATENCY):
+        self.max_rate = rate
+        self.min_rate = rate / 16
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.target_latency = target_latency
+        self.limit = max_in_flight
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self.errors = 0
+        self.error_rate = 0.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.slot_freed = asyncio.Event()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """等到有空闲的并发名额和令牌时返回,之后一定要调用 release()."""
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.in_flight >= self.limit:
+                    self.slot_freed.clear()
+                    await self.slot_freed.wait()
+                elif self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                else:
+                    break
+            self.tokens -= 1
+            self.in_flight += 1
+
+    def release(self, latency: float = None, ok: bool = True, throttled: bool = False) -> None:
+        """请求结束后调用,按响应时间和结果调整并发上限和速率.
+
+        latency 为 None 时(请求被取消等)只归还名额,不调整并发上限和速率.
+        """
+        self.in_flight -= 1
+        self.slot_freed.set()
+        if latency is None:
+            return
+        self.error_rate = self.error_rate * 0.9 + (0.0 if ok else 0.1)
+        if throttled or not ok:
+            if throttled:
+                self.throttled += 1
+            else:
+                self.errors += 1
+            self.limit = max(1, self.limit // 2)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.successes = 0
+        elif latency > self.target_latency:
+            self.limit = max(1, self.limit - 1)
+            self.successes = 0
+        else:
+            self.successes += 1
+            if self.successes >= self.limit:
+                self.successes = 0
+                self.limit = min(self.max_in_flight, self.limit + 1)
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 16)
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self.rate, 2),
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 3),
+        }
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """第 attempt 次重试前的等待时间: 指数退避加随机抖动."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,231 @@
+"""抓取过程的性能统计.
+
+记录每个接口(列表/详情)的响应时间分布,解析 JSON 的耗时,限速器等待时间,重试次数,
+下载的字节数,队列长度,每秒发现的 id 数和内存占用,定期写到一个快照文件里.文件名
+以 .prom 结尾时写成 Prometheus 文本格式,否则写成 JSON.用来判断慢在服务器,在解析
+还是在写文件.
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+# 耗时直方图的分桶上限(秒)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 快照文件的写入间隔(秒)
+INTERVAL = 10.0
+# 计算每秒速率的计数器
+RATE_COUNTERS = ("ids_total", "details_total", "requests_total")
+PREFIX = "scxk_"
+
+
+def current_rss():
+    """当前进程占用的内存(字节),取不到时返回 None."""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+class Metrics:
+    """计数器,当前值和耗时直方图,可以在多个线程之间共用."""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    break
+            else:
+                i = len(self.buckets)
+            hist["counts"][i] += 1
+            hist["sum"] += seconds
+            hist["count"] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """with metrics.timer("write_seconds"): ... 记录代码块的耗时."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def total(self, name: str) -> float:
+        """计数器 name 所有标签的合计."""
+        with self.lock:
+            return sum(value for (n, _), value in self.counters.items() if n == name)
+
+    def snapshot(self) -> dict:
+        """JSON 格式的快照,直方图的 buckets 是累计值,和 Prometheus 一样."""
+        def entries(items, convert):
+            return [dict(name=name, labels=dict(labels), **convert(value)) for (name, labels), value in sorted(items)]
+
+        def histogram(hist):
+            cumulative, total = [], 0
+            for count in hist["counts"]:
+                total += count
+                cumulative.append(total)
+            bounds = [str(b) for b in self.buckets] + ["+Inf"]
+            return {
+                "buckets": dict(zip(bounds, cumulative)),
+                "sum": hist["sum"],
+                "count": hist["count"],
+                "avg": hist["sum"] / hist["count"] if hist["count"] else 0.0,
+            }
+
+        with self.lock:
+            return {
+                "time": time.time(),
+                "uptime": time.time() - self.started,
+                "counters": entries(self.counters.items(), lambda v: {"value": v}),
+                "gauges": entries(self.gauges.items(), lambda v: {"value": v}),
+                "histograms": entries(self.histograms.items(), histogram),
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式的快照."""
+        def labels_text(labels, extra=None):
+            items = list(labels.items()) + (list(extra.items()) if extra else [])
+            if not items:
+                return ""
+            return "{" + ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in items) + "}"
+
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for kind, type_name in (("counters", "counter"), ("gauges", "gauge")):
+            for entry in snapshot[kind]:
+                name = PREFIX + entry["name"]
+                if name not in typed:
+                    lines.append("# TYPE {} {}".format(name, type_name))
+                    typed.add(name)
+                lines.append("{}{} {}".format(name, labels_text(entry["labels"]), entry["value"]))
+        for entry in snapshot["histograms"]:
+            name = PREFIX + entry["name"]
+            if name not in typed:
+                lines.append("# TYPE {} histogram".format(name))
+                typed.add(name)
+            for bound, count in entry["buckets"].items():
+                lines.append("{}_bucket{} {}".format(name, labels_text(entry["labels"], {"le": bound}), count))
+            lines.append("{}_sum{} {}".format(name, labels_text(entry["labels"]), entry["sum"]))
+            lines.append("{}_count{} {}".format(name, labels_text(entry["labels"]), entry["count"]))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """写快照文件,先写临时文件再替换,读取的一方不会读到写了一半的文件."""
+        if path.endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        os.replace(tmp_path, path)
+
+
+class MetricsReporter:
+    """后台线程,定期记录内存占用和每秒速率,并写快照文件."""
+
+    def __init__(self, metrics: "Metrics", path: str = None, interval: float = INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.last = {name: (time.time(), metrics.total(name)) for name in RATE_COUNTERS}
+
+    def sample(self) -> None:
+        rss = current_rss()
+        if rss is not None:
+            self.metrics.set("rss_bytes", rss)
+        now = time.time()
+        for name in RATE_COUNTERS:
+            total = self.metrics.total(name)
+            last_time, last_total = self.last[name]
+            if now > last_time:
+                self.metrics.set(name[:-len("_total")] + "_per_second", (total - last_total) / (now - last_time))
+            self.last[name] = (now, total)
+        if self.path:
+            self.metrics.write(self.path)
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self) -> "MetricsReporter":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止后台线程,并写最后一次快照."""
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.sample()
+
+
+@contextlib.contextmanager
+def profiled(path: str = None, top: int = 20):
+    """用 cProfile 记录代码块的耗时,path 为 None 时什么都不做.
+
+    结束时把统计数据存到 path(可以用 snakeviz 等工具查看),并打印累计耗时最多的
+    top 个函数.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        print(out.getvalue())
+        print("性能分析数据已保存到 {}".format(path))
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """返回进程内共用的统计对象."""
+    return _metrics
@@ -0,0 +1,304 @@
+"""本地模拟的 scxk.nmpa 接口,用来离线测试和测量爬虫的性能.
+
+模拟 portalAction.do 的 getXkzsList 和 getXkzsById 两个接口,返回的数据格式和
+data_example.json,result.json 一致.和真实网站一样,productName 是模糊查询(许可证
+编号包含关键字即可,"粤妆2016" 这样的关键字就是前缀匹配),只能查询前 50 页.还可以
+设置每个请求的延迟,出错的比例和每秒最多处理的请求数,超过时返回 429.
+
+    python scxk_mock_server.py --port 8081 --latency 0.05
+    SCXK_BASE_URL=http://127.0.0.1:8081 python scxk_nmpa_final.py
+"""
+
+import argparse
+import copy
+import datetime
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATH = "/xk/itownet/portalAction.do"
+PAGE_SIZE = 15
+# 服务器最多只允许查询前 50 页
+MAX_PAGE = 50
+START_YEAR = 2016
+END_YEAR = 2021
+# 每个省份模拟的许可证数量,粤超过 50 页需要按年份细分
+PROVINCES = {
+    "粤": 1200,
+    "浙": 300,
+    "闽": 100,
+    "京": 30,
+}
+QF_MANAGER_NAMES = {
+    "粤": "广东省药品监督管理局",
+    "浙": "浙江省药品监督管理局",
+    "闽": "福建省药品监督管理局",
+    "京": "北京市药品监督管理局",
+}
+
+# 详情数据的模板,取自 result.json
+DETAIL_TEMPLATE = {
+    "businessLicenseNumber": "9135072459788424XQ",
+    "businessPerson": "徐文胜",
+    "certStr": "一般液态单元（啫喱类、护发清洁类）；膏霜乳液单元（护肤清洁类）；粉单元（块状粉类、散粉类）；蜡基单元（蜡基类）",
+    "cityCode": "",
+    "countyCode": "",
+    "creatUser": "",
+    "createTime": "",
+    "endTime": "",
+    "epsAddress": "松溪县经济技术开发区",
+    "epsName": "福建金亿文化用品有限公司",
+    "epsProductAddress": "福建省南平市松溪县松源街道办事处经济技术开发区中天路8号",
+    "id": "",
+    "isimport": "N",
+    "legalPerson": "徐文胜",
+    "offDate": "",
+    "offReason": "",
+    "parentid": "",
+    "preid": "",
+    "processid": "202111171018542027xjhn",
+    "productSn": "闽妆20170002",
+    "provinceCode": "",
+    "qfDate": "",
+    "qfManagerName": "福建省药品监督管理局",
+    "qualityPerson": "沈金娟",
+    "rcManagerDepartName": "南平市松溪县市场监督管理局",
+    "rcManagerUser": "林银良；陈芬丽；陈淑青",
+    "startTime": "",
+    "warehouseAddress": "",
+    "xkCompleteDate": None,
+    "xkDate": "2027-01-05",
+    "xkDateStr": "2022-01-05",
+    "xkName": "俞开海",
+    "xkProject": "",
+    "xkRemark": "",
+    "xkType": "202",
+}
+
+
+def java_date(date: datetime.date) -> dict:
+    """列表接口里 XK_COMPLETE_DATE 的格式(Java Date 序列化出来的字典)."""
+    dt = datetime.datetime(date.year, date.month, date.day, tzinfo=datetime.timezone(datetime.timedelta(hours=8)))
+    return {
+        "date": date.day,
+        "day": (date.weekday() + 1) % 7,
+        "hours": 0,
+        "minutes": 0,
+        "month": date.month - 1,
+        "nanos": 0,
+        "seconds": 0,
+        "time": int(dt.timestamp() * 1000),
+        "timezoneOffset": -480,
+        "year": date.year - 1900,
+    }
+
+
+def make_records(provinces: dict = PROVINCES, scale: float = 1.0, seed: int = 0) -> list:
+    """生成模拟的许可证数据,每条包含列表接口和详情接口返回的两部分.
+
+    每个省份的许可证平均分到 START_YEAR..END_YEAR 各年,编号从 0001 开始.同样的
+    参数每次生成的数据都一样.
+    """
+    rng = random.Random(seed)
+    records = []
+    years = END_YEAR - START_YEAR + 1
+    for province, count in provinces.items():
+        count = int(count * scale)
+        for i in range(count):
+            year = START_YEAR + i % years
+            sn = "{}妆{}{:04d}".format(province, year, i // years + 1)
+            id = hashlib.md5(sn.encode("utf-8")).hexdigest()
+            issue_date = datetime.date(2021, 1, 1) + datetime.timedelta(days=rng.randrange(365))
+            expiry_date = issue_date.replace(year=issue_date.year + 5) - datetime.timedelta(days=1)
+            license_number = "91{:06d}{:08d}{}".format(rng.randrange(10 ** 6), rng.randrange(10 ** 8), "ABCDX"[i % 5])
+            eps_name = "{}模拟化妆品有限公司{}".format(province, i)
+            detail = dict(
+                DETAIL_TEMPLATE,
+                businessLicenseNumber=license_number,
+                epsName=eps_name,
+                processid="{}{}".format(issue_date.strftime("%Y%m%d"), id[:12]),
+                productSn=sn,
+                qfManagerName=QF_MANAGER_NAMES.get(province, province + "药品监督管理局"),
+                xkDate=expiry_date.isoformat(),
+                xkDateStr=issue_date.isoformat(),
+            )
+            item = {
+                "ID": id,
+                "EPS_NAME": eps_name,
+                "PRODUCT_SN": sn,
+                "CITY_CODE": None,
+                "XK_COMPLETE_DATE": java_date(issue_date),
+                "XK_DATE": detail["xkDate"],
+                "QF_MANAGER_NAME": detail["qfManagerName"],
+                "BUSINESS_LICENSE_NUMBER": license_number,
+                "XC_DATE": (issue_date + datetime.timedelta(days=1)).isoformat(),
+            }
+            records.append({"item": item, "detail": detail})
+    # 和网站一样按发证日期倒序排列
+    records.sort(key=lambda r: (r["detail"]["xkDateStr"], r["item"]["ID"]), reverse=True)
+    return records
+
+
+class MockScxk:
+    """模拟接口的数据和行为设置,可以在多个请求线程之间共用."""
+
+    def __init__(self, records: list, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit: float = 0.0, seed: int = 0):
+        self.records = records
+        self.details = {r["item"]["ID"]: r["detail"] for r in records}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # 每秒最多处理的请求数,0 表示不限制
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.tokens = rate_limit
+        self.last_refill = time.monotonic()
+        self.counts = {"list": 0, "detail": 0, "errors": 0, "throttled": 0}
+
+    def search(self, kw: str) -> list:
+        return [r["item"] for r in self.records if kw in r["item"]["PRODUCT_SN"]]
+
+    def get_list(self, form: dict) -> dict:
+        kw = form.get("productName", "")
+        page = int(form.get("page") or 1)
+        page_size = int(form.get("pageSize") or PAGE_SIZE)
+        items = self.search(kw)
+        rows = []
+        if 1 <= page <= MAX_PAGE:
+            for n, item in enumerate(items[(page - 1) * page_size:page * page_size]):
+                rows.append(dict(item, NUM_=(page - 1) * page_size + n + 1))
+        return {
+            "filesize": "",
+            "keyword": "",
+            "list": rows,
+            "orderBy": "createDate",
+            "orderType": "desc",
+            "pageCount": math.ceil(len(items) / page_size),
+            "pageNumber": page,
+            "pageSize": page_size,
+            "property": "",
+            "totalCount": len(items),
+        }
+
+    def get_detail(self, form: dict) -> dict:
+        detail = self.details.get(form.get("id", ""))
+        return copy.deepcopy(detail) if detail is not None else {}
+
+    def admit(self) -> str:
+        """决定这个请求的结果: "ok",限流时 "throttled",模拟出错时 "error"."""
+        with self.lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self.tokens = min(self.rate_limit, self.tokens + (now - self.last_refill) * self.rate_limit)
+                self.last_refill = now
+                if self.tokens < 1:
+                    self.counts["throttled"] += 1
+                    return "throttled"
+                self.tokens -= 1
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return "error"
+            return "ok"
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get("Content-Length") or 0)
+        form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode("utf-8")))
+        parts = urllib.parse.urlsplit(self.path)
+        method = dict(urllib.parse.parse_qsl(parts.query)).get("method")
+        if parts.path != PATH or method not in ("getXkzsList", "getXkzsById"):
+            self.reply(404, b"not found", "text/plain")
+            return
+
+        time.sleep(mock.delay())
+        result = mock.admit()
+        if result == "throttled":
+            self.reply(429, b"too many requests", "text/plain", {"Retry-After": "1"})
+            return
+        if result == "error":
+            self.reply(500, b"<html><body>error</body></html>", "text/html")
+            return
+
+        if method == "getXkzsList":
+            payload = mock.get_list(form)
+            key = "list"
+        else:
+            payload = mock.get_detail(form)
+            key = "detail"
+        with mock.lock:
+            mock.counts[key] += 1
+        self.reply(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json;charset=UTF-8")
+
+    def reply(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(mock: MockScxk, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """在后台线程里启动模拟服务器,port 为 0 时自动选择端口,返回服务器对象."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.mock = mock
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return "http://{}:{}".format(host, port)
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--scale", type=float, default=1.0, help="模拟数据量的倍数")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机波动范围(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的请求比例")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每秒最多处理的请求数,超过返回 429,0 表示不限制")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+
+
+def mock_from_args(args) -> MockScxk:
+    return MockScxk(make_records(scale=args.scale, seed=args.seed), latency=args.latency, jitter=args.jitter,
+                    error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟的 scxk.nmpa 接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    mock = mock_from_args(args)
+    server = start_server(mock, args.host, args.port)
+    print("模拟服务器已启动: {},共 {} 条数据".format(server_url(server), len(mock.records)))
+    print("运行爬虫前设置环境变量 SCXK_BASE_URL={}".format(server_url(server)))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("请求统计: {}".format(mock.counts))
+        server.shutdown()
@@ -1,5 +1,19 @@
-import requests
+import argparse
+import asyncio
+import collections
+import datetime
 import json
+import queue
+import threading
+import time
+
+import scxk_aio
+from scxk_aio import get_client, print_stats
+from scxk_cache import CACHE_FILE, ResponseCache
+from scxk_journal import CrawlJournal
+from scxk_metrics import MetricsReporter, get_metrics, profiled
+from scxk_record import PermitRecord, compact
+from scxk_sink import JsonSink
 
 cities = [
     "京",
@@ -37,137 +51,312 @@ cities = [
     # "澳",
     # "台",
 ]
-headers = {
-    'Origin':
-        'http://scxk.nmpa.gov.cn:81',
-    'Referer':
-        'http://scxk.nmpa.gov.cn:81/xk/',
-    'User-Agent':
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36',
-}
+# 同时抓取的详情页数
+WORKERS = 8
+# 服务器最多只允许查询前 50 页
+MAX_PAGE = 50
+# 许可证编号从 2016 年开始
+START_YEAR = 2016
+# 完整许可证编号的长度,例如 "粤妆20160001"
+SN_LENGTH = 10
+# 流水线中等待抓取详情的 id 队列长度,队列满了列表页的抓取就会暂停
+QUEUE_SIZE = 500
 
 
-def get_all_id(kw: str) -> list:
+def get_all_id(kw: str, cache: dict = None, id_queue: queue.Queue = None,
+               journal: CrawlJournal = None, incremental: bool = False) -> list:
+    """按细分后的叶子关键字获取 kw 下所有的 id(去掉重复),传入 id_queue 时每个 id 也会放进队列.
 
+    传入 journal 时,查询计划和每个叶子关键字的 id 都会记录到日志里,已经完成的部分
+    直接从日志读取.incremental 为 True 时重新规划查询,只重新遍历数据条数和日志里
+    不一样的叶子,并把其中有效期(xkDate)变化了的详情从日志里删掉,让它们重新抓取.
+    """
     ids = list()
-    page_count = get_pages_status(kw)["page_count"]
-    total_count = get_pages_status(kw)["total_count"]
-    print("{} 的总共数据条数{}".format(kw,total_count))
-    # 页数小于50:
-    if page_count <= 50 and page_count > 0:
-        ids = get_pages(page_count, kw)
-        print("关键词{}的查询条数{}".format(kw,len(ids)))
-    else:
-        print(kw, "开始按年查找")
-        year = 2016
-        while len(ids) < total_count:
-            print("year search loop")
-            kw_year = kw + str(year)
-            total_amount = get_pages_status(kw_year)["total_count"]
-            page_amount = get_pages_status(kw_year)["page_count"]
-            if page_amount <= 50:
-                ids.extend(get_pages(page_amount,kw_year))
-                print("{}:{}".format(kw_year, total_amount))
-            else:
-                print(kw_year, "开始按编号查找")
-                num = 0
-                print("ids",len(ids), "total_amount", total_amount)
-                ids_year = list()
-                while len(ids_year) < total_amount:
-                    kw_num = kw_year + "{:0>2}".format(num)
-                    print("查找总数据条数:", total_amount,"以获取条数:", len(ids_year),"kw:",kw_num)
-                    pages = get_pages_status(kw_num)["page_count"]
-                    print(" 关键词:", kw_num)
-                    ids_year.extend(get_pages(pages,kw_num))
-                    num += 1
-                ids.extend(ids_year)
-                print("ids_year",len(ids_year),kw_year)
-            year += 1
+    seen = set()
+    duplicates = 0
+
+    def collect(leaf_ids):
+        # 页码边界上的数据在翻页过程中可能移动,同一个 id 会出现在两页或两个叶子里,只保留第一次
+        nonlocal duplicates
+        for id in leaf_ids:
+            if id in seen:
+                duplicates += 1
+                continue
+            seen.add(id)
+            ids.append(id)
+            if id_queue is not None:
+                id_queue.put(id)
+
+    incremental = incremental and journal is not None
+    leaves = journal.get_plan(kw) if journal is not None and not incremental else None
+    if leaves is None:
+        leaves = plan_queries(kw, cache)
+        if journal is not None:
+            journal.save_plan(kw, leaves)
+    total_count = sum(leaf["total_count"] for leaf in leaves)
+    print("{} 细分为 {} 个查询,总共数据条数{}".format(kw, len(leaves), total_count))
+    for leaf in leaves:
+        leaf_ids = journal.get_leaf(leaf["kw"]) if journal is not None else None
+        if leaf_ids is not None and incremental and journal.get_leaf_total(leaf["kw"]) != leaf["total_count"]:
+            leaf_ids = None
+        if leaf_ids is not None:
+            collect(leaf_ids)
+            continue
+        if incremental:
+            leaf_ids = walk_changed_leaf(leaf, journal)
+        else:
+            # 第一页已经在探测时取到了,从第二页开始请求
+            leaf_ids = leaf["first_ids"] + get_pages(leaf["page_count"], leaf["kw"], start=2)
+        print("关键词{}的查询条数{}".format(leaf["kw"], len(leaf_ids)))
+        if journal is not None:
+            journal.finish_leaf(leaf["kw"], leaf_ids, leaf["total_count"])
+        collect(leaf_ids)
+    if duplicates:
+        print("{} 去掉重复的 id {} 条".format(kw, duplicates))
     return ids
 
 
-def get_ids_by_year(kw, total) -> list:
-    year = 2016
-    ids = list()
-    kw = kw + str(year)
-    while len(ids) < total:
-        pass
-
-
-def get_pages(page, kw) -> list:
-    """获取所有分页的id."""
-    id_list = list()
-    for i in range(1, page + 1):
-        data = {
-            'on': 'true',
-            'page': i,
-            'pageSize': '15',
-            'productName': kw,
-            'conditionType': '1',
-            'applyname': '',
-            'applysn': '',
-        }
-        list_url = "http://scxk.nmpa.gov.cn:81/xk/itownet/portalAction.do?method=getXkzsList"
-        response = requests.post(url=list_url, data=data, headers=headers)
-        result = response.json()
-        # total_count = result["totalCount"]
-        # page_count = result["pageCount"]
-        ids = [i["ID"] for i in result["list"]]
-        id_list.extend(ids)
+def walk_changed_leaf(leaf: dict, journal: CrawlJournal) -> list:
+    """增量模式下重新遍历一个数据条数变化了的叶子,删掉日志里有效期变化了的详情."""
+    xk_dates = dict(leaf["first_xk_dates"])
+    leaf_ids = leaf["first_ids"] + get_pages(leaf["page_count"], leaf["kw"], start=2, xk_dates=xk_dates)
+    stale = 0
+    for id in leaf_ids:
+        detail = journal.get_detail(id)
+        if detail is not None and detail.get("xkDate") != xk_dates.get(id):
+            journal.drop_detail(id)
+            stale += 1
+    print("关键词{}的数据有变化,重新抓取{}条有效期变化的详情".format(leaf["kw"], stale))
+    return leaf_ids
+
+
+def plan_queries(kw: str, cache: dict = None) -> list:
+    """递归细分查询关键字,直到每个叶子关键字的页数不超过 MAX_PAGE.
+
+    例如 粤妆 -> 粤妆2017 -> 粤妆20170 -> 粤妆201705,只有超过页数上限的关键字才
+    继续细分,没有数据的关键字直接丢弃.同一个关键字只探测一次,结果保存在 cache 里.
+    返回叶子查询的列表,每项包含 kw, page_count, total_count, first_ids(第一页的 id)
+    和 first_xk_dates(第一页每个 id 的有效期).
+    """
+    if cache is None:
+        cache = dict()
+    if kw not in cache:
+        cache[kw] = get_pages_status(kw)
+    status = cache[kw]
+    if status["total_count"] == 0:
+        return []
+    leaf = {
+        "kw": kw,
+        "page_count": status["page_count"],
+        "total_count": status["total_count"],
+        "first_ids": status["ids"],
+        "first_xk_dates": status["xk_dates"],
+    }
+    if status["page_count"] <= MAX_PAGE:
+        return [leaf]
+    if len(kw) >= SN_LENGTH:
+        # 已经是完整的许可证编号了,无法再细分,只能取前 MAX_PAGE 页
+        print("关键词{}无法再细分,只获取前{}页".format(kw, MAX_PAGE))
+        leaf["page_count"] = MAX_PAGE
+        return [leaf]
+    leaves = list()
+    for child in refine_keyword(kw):
+        leaves.extend(plan_queries(child, cache))
+    return leaves
+
+
+def refine_keyword(kw: str) -> list:
+    """关键字的下一级细分: {省份}妆 后面接年份,年份之后逐位接编号."""
+    if kw.endswith("妆"):
+        return [kw + str(year) for year in range(START_YEAR, datetime.date.today().year + 1)]
+    return [kw + str(digit) for digit in range(10)]
+
+
+def get_pages(page, kw, start: int = 1, xk_dates: dict = None) -> list:
+    """获取第 start 页到第 page 页的id,这些页会同时请求.
+
+    传入 xk_dates 时,列表页里每个 id 的有效期(XK_DATE)也会记到 xk_dates 里.
+    """
+    id_list = scxk_aio.run(scxk_aio.get_pages(page, kw, start, xk_dates))
+    get_metrics().inc("ids_total", len(id_list))
     return id_list
 
 def get_pages_status(kw) -> dict:
     """获取分页总数."""
-    pages_status = dict()
-    list_url = "http://scxk.nmpa.gov.cn:81/xk/itownet/portalAction.do?method=getXkzsList"
-    data = {
-        'on': 'true',
-        'page': "1",
-        'pageSize': '15',
-        'productName': kw,
-        'conditionType': '1',
-        'applyname': '',
-        'applysn': '',
-    }
-    response = requests.post(url=list_url, data=data, headers=headers)
-    result = response.json()
-    page_count = result["pageCount"]
-    total_count = result["totalCount"]
-    pages_status["page_count"] = page_count
-    pages_status["total_count"] = total_count
+    pages_status = scxk_aio.run(scxk_aio.get_pages_status(kw))
+    get_metrics().inc("ids_total", len(pages_status["ids"]))
     return pages_status
 
 def get_detail(id: str) -> dict:
-    url = "http://scxk.nmpa.gov.cn:81/xk/itownet/portalAction.do?method=getXkzsById"
-    data = {"id": id}
-    response = requests.post(url=url, data=data, headers=headers)
-    result = response.json()
-    detail_data = result
-    return detail_data
+    return scxk_aio.run(scxk_aio.get_detail(id))
+
+
+async def fetch_detail_async(id: str, journal: CrawlJournal = None) -> PermitRecord:
+    """抓取一条详情,日志里已有的直接返回,新抓取的写入日志."""
+    # 日志的读写会等待数据库锁,放到线程池里执行,不阻塞事件循环
+    if journal is not None:
+        detail = await asyncio.to_thread(journal.get_detail, id)
+        if detail is not None:
+            get_metrics().inc("details_total", source="journal")
+            return compact(detail)
+    detail = await scxk_aio.get_detail(id)
+    get_metrics().inc("details_total", source="server")
+    if journal is not None:
+        await asyncio.to_thread(journal.save_detail, id, detail)
+    return compact(detail)
+
+
+def fetch_detail(id: str, journal: CrawlJournal = None) -> PermitRecord:
+    return scxk_aio.run(fetch_detail_async(id, journal))
+
+
+def fetch_details(ids: list) -> list:
+    """在事件循环里同时抓取所有详情页,返回结果的顺序与 ids 一致."""
+    start = time.time()
+    details = scxk_aio.run(scxk_aio.fetch_details(ids))
+    elapsed = time.time() - start
+    print("抓取详情 {} 条,耗时 {:.1f}s,速度 {:.1f} 条/s".format(
+        len(details), elapsed, len(details) / elapsed if elapsed else 0))
+    return details
+
+
+class PipelineStopped(Exception):
+    """流水线的消费者已经不再读取 id,列表页的遍历线程应该退出."""
+
+
+class IdQueue(queue.Queue):
+    """流水线里的 id 队列.stop() 之后 put 抛出 PipelineStopped,阻塞在 put 上的线程也会被唤醒."""
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.stopped = False
+
+    def put(self, item, block=True, timeout=None):
+        if self.stopped:
+            raise PipelineStopped()
+        super().put(item, block, timeout)
+
+    def stop(self) -> None:
+        self.stopped = True
+        with self.mutex:
+            self.queue.clear()
+            self.not_full.notify_all()
+
+
+def crawl_pipeline(kws: list, workers: int = WORKERS, queue_size: int = QUEUE_SIZE,
+                   journal: CrawlJournal = None, incremental: bool = False):
+    """列表页和详情页流水线抓取,按 id 被发现的顺序逐条产出详情数据(PermitRecord).
+
+    后台线程遍历 kws 的列表页,把 id 放进长度为 queue_size 的队列;当前线程从队列里
+    取 id 交给事件循环抓取详情.队列满时列表页的抓取会阻塞,正在抓取的详情最多
+    workers * 2 条,内存占用不会随数据量增长.传入 journal 时已经抓取过的详情直接
+    从日志读取,incremental 的含义见 get_all_id.没有读完就关闭(close)时,遍历线程
+    和还没完成的详情请求都会停下.
+    """
+    id_queue = IdQueue(maxsize=queue_size)
+    errors = list()
+
+    def walk_pages():
+        try:
+            for kw in kws:
+                get_all_id(kw, id_queue=id_queue, journal=journal, incremental=incremental)
+        except PipelineStopped:
+            return
+        except Exception as e:
+            errors.append(e)
+        try:
+            id_queue.put(None)
+        except PipelineStopped:
+            pass
+
+    walker = threading.Thread(target=walk_pages, daemon=True)
+    walker.start()
+    pending = collections.deque()
+    metrics = get_metrics()
+    loop = scxk_aio.get_loop()
+    try:
+        while True:
+            id = id_queue.get()
+            if id is None:
+                break
+            pending.append(asyncio.run_coroutine_threadsafe(fetch_detail_async(id, journal), loop))
+            metrics.set("id_queue_depth", id_queue.qsize())
+            metrics.set("pending_details", len(pending))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # 正常结束时遍历线程已经退出;提前关闭或出错时让它停下,取消没完成的详情请求
+        id_queue.stop()
+        for future in pending:
+            future.cancel()
+    walker.join()
+    if errors:
+        raise errors[0]
+
+
+def plan_only(kws: list) -> None:
+    """只做查询规划,输出每个关键字细分出的叶子查询,不抓取详情."""
+    total = 0
+    for kw in kws:
+        leaves = plan_queries(kw)
+        count = sum(leaf["total_count"] for leaf in leaves)
+        total += count
+        print("{} 细分为 {} 个查询,总共数据条数{}: {}".format(
+            kw, len(leaves), count, ", ".join(leaf["kw"] for leaf in leaves)))
+    print("总共数据条数{}".format(total))
+    print_stats()
 
 
 def save_data(fp, data) -> None:
     json.dump(data, fp, ensure_ascii=False, sort_keys=True, indent=4)
 
 
-def main():
-    id_all = list()
-    for city in cities:
-        kw = city + "妆"
-        ids = get_all_id(kw)
-        id_all.extend(ids)
-        print("总共已经获取id数",len(id_all))
-    # id_all = get_all_id("粤妆")
-    # print(len(id_all))
-    # print(len(set(id_all)))
-    details = list()
-    for id in id_all:
-        print(" 正在抓取 id: {}的详情信息".format(id))
-        details.append(get_detail(id))
-    fp = open("./results.json", "w")
-    json.dump(details, fp, ensure_ascii=False, sort_keys=True, indent=4)
-
+def main(incremental: bool = False, metrics_file: str = None, metrics_interval: float = 10.0):
+    """metrics_file 不为空时,每隔 metrics_interval 秒把性能统计写到这个文件."""
+    kws = [city + "妆" for city in cities]
+    journal = CrawlJournal()
+    if incremental and not journal.stats()["plans"]:
+        print("日志 {} 里没有上次抓取的记录,改为全量抓取".format(journal.path))
+        incremental = False
+    print("从日志 {} 恢复: {}{}".format(journal.path, journal.stats(), ",增量模式" if incremental else ""))
+    start = time.time()
+    metrics = get_metrics()
+    reporter = MetricsReporter(metrics, metrics_file, metrics_interval).start()
+    with JsonSink("./results.json", indent=4, sort_keys=True) as sink:
+        # sink.count 只在批量写入时才更新,进度按产出的条数计算
+        for count, detail in enumerate(crawl_pipeline(kws, journal=journal, incremental=incremental), 1):
+            with metrics.timer("write_seconds"):
+                sink.write(detail)
+            if count % 100 == 0:
+                print("总共已经抓取详情数", count)
+    elapsed = time.time() - start
+    print("抓取详情 {} 条,耗时 {:.1f}s,速度 {:.1f} 条/s".format(
+        sink.count, elapsed, sink.count / elapsed if elapsed else 0))
+    print_stats()
+    reporter.stop()
+    if metrics_file:
+        print("性能统计已保存到 {}".format(metrics_file))
+    journal.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="抓取 scxk.nmpa 上的化妆品生产许可信息")
+    parser.add_argument("--incremental", action="store_true",
+                        help="只重新抓取数据条数有变化的查询和有效期变化或新增的详情")
+    parser.add_argument("--metrics", help="定期把性能统计写到这个文件,以 .prom 结尾时为 Prometheus 文本格式,否则为 JSON")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="性能统计的写入间隔(秒)")
+    parser.add_argument("--profile", help="用 cProfile 分析整个抓取过程,把结果保存到这个文件")
+    parser.add_argument("--cache", nargs="?", const=CACHE_FILE,
+                        help="把接口响应缓存到 SQLite 文件,重复运行时直接读取,默认 " + CACHE_FILE)
+    parser.add_argument("--offline", action="store_true", help="不请求服务器,只从响应缓存读取")
+    parser.add_argument("--plan-only", action="store_true", help="只做查询规划并输出结果,不抓取详情")
+    args = parser.parse_args()
+    if args.cache or args.offline:
+        get_client().cache = ResponseCache(args.cache or CACHE_FILE, offline=args.offline)
+    with profiled(args.profile):
+        if args.plan_only:
+            plan_only([city + "妆" for city in cities])
+        else:
+            main(incremental=args.incremental, metrics_file=args.metrics, metrics_interval=args.metrics_interval)
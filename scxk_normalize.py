@@ -0,0 +1,229 @@
+"""详情数据的清洗和校验.
+
+详情接口返回的字段都是字符串,格式也不统一: xkDate 是有效期截止日期
+("2027-01-05"),xkDateStr 是发证日期("2022-01-05"),xkCompleteDate 经常是 null,
+列表接口里则是带 time(毫秒时间戳)的字典;rcManagerUser 是用 "；" 连起来的多个人名;
+省份和年份藏在许可证编号 productSn 里.这里用 pandas 按列批量处理: 每次读取
+CHUNK_SIZE 条记录组成一个 DataFrame,日期转成 datetime64,多值字段拆成列表,从
+productSn 拆出省份,年份和序号,再检查每条记录是否符合格式,不逐条解析字典.
+输出里日期和多值字段只有清洗后的列(例如 xkDate 换成 expires),未知字段只出现在
+issues.csv 里.
+需要安装 pandas,输出 Parquet 时还需要 pyarrow.
+
+    python scxk_normalize.py results.json -o normalized.parquet --issues issues.csv
+"""
+
+import argparse
+import collections
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from scxk_reader import CHUNK_SIZE, iter_frames
+from scxk_record import FIELDS
+
+OUTPUT_FILE = "normalized.csv"
+ISSUES_FILE = "issues.csv"
+# 许可证编号: 省份简称 + 妆 + 4 位年份 + 4 位序号
+SN_PATTERN = r"^(?P<province>.)妆(?P<sn_year>\d{4})(?P<sn_serial>\d{4})$"
+# 日期字段: 原字段 -> 清洗后的列
+DATE_COLUMNS = {
+    "xkDate": "expires",
+    "xkDateStr": "issued",
+    "qfDate": "qf_date",
+    "offDate": "off_date",
+    "startTime": "start_time",
+    "endTime": "end_time",
+}
+# 用分号连起来的多值字段: 原字段 -> 清洗后的列
+LIST_COLUMNS = {"rcManagerUser": "rc_manager_users"}
+LIST_SEPARATOR = r"\s*[；;]\s*"
+# 取值很少的字段,转成 category 节省内存,join 也更快
+CATEGORY_COLUMNS = ["province", "qfManagerName", "rcManagerDepartName", "xkType", "isimport"]
+# 不能为空的字段
+REQUIRED = ["productSn", "epsName", "businessLicenseNumber", "xkDate"]
+# 毫秒时间戳是北京时间
+TIMEZONE = "Asia/Shanghai"
+# 日期列统一的类型,各批写到同一个 Parquet 文件时类型要一致
+DATE_DTYPE = "datetime64[ns]"
+
+
+def blank_to_na(column: pd.Series) -> pd.Series:
+    """字符串列: 去掉首尾空白,空字符串和 None 都变成缺失值."""
+    column = column.astype("string").str.strip()
+    return column.mask(column == "")
+
+
+def parse_dates(column: pd.Series) -> pd.Series:
+    """"2027-01-05" 或 "2027-01-05 10:00:00" 这样的字符串转成日期,格式不对的为 NaT."""
+    dates = pd.to_datetime(blank_to_na(column).str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+    return dates.astype(DATE_DTYPE)
+
+
+def parse_complete_date(column: pd.Series) -> pd.Series:
+    """xkCompleteDate: 可能是 null,日期字符串,或者带 time(毫秒时间戳)的字典."""
+    is_dict = column.map(type).to_numpy() == dict
+    if not is_dict.any():
+        return parse_dates(column.where(column.notna(), None).astype("string"))
+    millis = pd.to_numeric(column[is_dict].str.get("time"), errors="coerce")
+    from_millis = pd.to_datetime(millis, unit="ms", utc=True).dt.tz_convert(TIMEZONE).dt.tz_localize(None)
+    result = parse_dates(column.mask(is_dict).astype("string"))
+    result[is_dict] = from_millis.dt.normalize().astype(DATE_DTYPE)
+    return result
+
+
+def split_list(column: pd.Series) -> pd.Series:
+    """"张三；李四" -> ["张三", "李四"],空值为 []."""
+    column = blank_to_na(column).str.strip("；; ")
+    parts = column.fillna("").str.split(LIST_SEPARATOR, regex=True)
+    return parts.where(column.fillna("") != "", pd.Series([[]] * len(column), index=column.index, dtype=object))
+
+
+def normalize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """清洗一批详情数据,返回类型统一的列.
+
+    FIELDS 里的字符串字段保留原来的列名,空字符串变成缺失值;日期字段和 xkCompleteDate
+    换成 DATE_COLUMNS 里的日期列和 completed,rcManagerUser 换成 rc_manager_users 列表,
+    原来的字符串列不再保留.不在 FIELDS 里的字段不会输出,只在 validate_frame 的问题里
+    记为 "未知字段".
+    """
+    frame = frame.reindex(columns=list(dict.fromkeys(FIELDS + list(frame.columns))))
+    result = pd.DataFrame(index=frame.index)
+    for field in FIELDS:
+        if field in DATE_COLUMNS or field in LIST_COLUMNS or field == "xkCompleteDate":
+            continue
+        result[field] = blank_to_na(frame[field])
+    parts = result["productSn"].str.extract(SN_PATTERN)
+    result["province"] = parts["province"]
+    result["sn_year"] = pd.to_numeric(parts["sn_year"]).astype("Int16")
+    result["sn_serial"] = pd.to_numeric(parts["sn_serial"]).astype("Int16")
+    for field, column in DATE_COLUMNS.items():
+        result[column] = parse_dates(frame[field])
+    result["completed"] = parse_complete_date(frame["xkCompleteDate"])
+    for field, column in LIST_COLUMNS.items():
+        result[column] = split_list(frame[field])
+    result["revoked"] = (result["off_date"].notna() | result["offReason"].notna()).astype("boolean")
+    for column in CATEGORY_COLUMNS:
+        result[column] = result[column].astype("category")
+    return result
+
+
+def validate_frame(raw: pd.DataFrame, normalized: pd.DataFrame, seen: set = None) -> pd.DataFrame:
+    """检查一批数据,返回问题列表: productSn, field, problem 三列.
+
+    seen 是之前各批已经出现过的许可证编号,用来发现跨批次的重复,检查后会加入这一批的编号.
+    """
+    issues = []
+
+    def add(mask, field, problem):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            issues.append(pd.DataFrame({
+                "productSn": normalized["productSn"].to_numpy()[mask],
+                "field": field,
+                "problem": problem,
+            }))
+
+    for field in raw.columns.difference(FIELDS):
+        # 一批里只要有一条记录有这个字段,DataFrame 里就会有这一列,其他记录是缺失值
+        add(raw[field].notna(), field, "未知字段")
+    for field in REQUIRED:
+        if field not in raw.columns:
+            add(np.ones(len(raw), dtype=bool), field, "缺少字段")
+    present = normalized["productSn"].notna()
+    for field in REQUIRED:
+        if field in raw.columns:
+            add(blank_to_na(raw[field]).isna(), field, "为空")
+    add(present & normalized["province"].isna(), "productSn", "编号格式错误")
+    for field, column in DATE_COLUMNS.items():
+        if field in raw.columns:
+            add(blank_to_na(raw[field]).notna() & normalized[column].isna(), field, "日期格式错误")
+    add((normalized["issued"] > normalized["expires"]).fillna(False), "xkDateStr", "发证日期晚于有效期")
+    add((normalized["sn_year"] > normalized["issued"].dt.year).fillna(False), "productSn", "编号年份晚于发证日期")
+    duplicated = normalized["productSn"].duplicated() & present
+    if seen is not None:
+        duplicated |= normalized["productSn"].isin(seen)
+        seen.update(normalized["productSn"].dropna())
+    add(duplicated, "productSn", "重复")
+    if not issues:
+        return pd.DataFrame(columns=["productSn", "field", "problem"])
+    return pd.concat(issues, ignore_index=True)
+
+
+def iter_normalized(path: str, chunk_size: int = CHUNK_SIZE):
+    """逐批读取 path,产出 (清洗后的 DataFrame, 问题 DataFrame)."""
+    seen = set()
+    for frame in iter_frames(path, chunk_size=chunk_size):
+        normalized = normalize_frame(frame)
+        yield normalized, validate_frame(frame, normalized, seen)
+
+
+class FrameWriter:
+    """把清洗后的各批数据追加写到 CSV 或 Parquet(以 .parquet 结尾时)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer = None
+        self.header = True
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.path.endswith(".parquet"):
+            self._write_parquet(frame)
+            return
+        frame = frame.assign(**{
+            column: frame[column].map(lambda items: json.dumps(items, ensure_ascii=False))
+            for column in LIST_COLUMNS.values() if column in frame
+        })
+        frame.to_csv(self.path, mode="w" if self.header else "a", header=self.header, index=False,
+                     encoding="utf-8-sig" if self.header else "utf-8", date_format="%Y-%m-%d")
+        self.header = False
+
+    def _write_parquet(self, frame: pd.DataFrame) -> None:
+        import pyarrow
+        import pyarrow.parquet
+
+        # 各批的 category 取值不同,写入时统一成字符串,Parquet 本身会做字典编码
+        frame = frame.astype({column: "string" for column in CATEGORY_COLUMNS if column in frame})
+        table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按列批量清洗和校验详情数据")
+    parser.add_argument("path", help="results.json / items.json 等详情数据文件")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE, help="清洗后的数据,以 .parquet 结尾时输出 Parquet")
+    parser.add_argument("--issues", default=ISSUES_FILE, help="校验发现的问题")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="每批处理的条数")
+    args = parser.parse_args()
+
+    start = time.time()
+    rows = 0
+    problems = collections.Counter()
+    with FrameWriter(args.output) as writer, open(args.issues, "w", encoding="utf-8-sig", newline="") as fp:
+        fp.write("productSn,field,problem\n")
+        for normalized, issues in iter_normalized(args.path, args.chunk_size):
+            writer.write(normalized)
+            issues.to_csv(fp, header=False, index=False)
+            rows += len(normalized)
+            problems.update(dict(issues.groupby(["field", "problem"]).size()))
+    print("清洗 {} 条,保存到 {},耗时 {:.1f}s".format(rows, args.output, time.time() - start))
+    if problems:
+        print("发现 {} 个问题,保存到 {}:".format(sum(problems.values()), args.issues))
+        for (field, problem), count in sorted(problems.items()):
+            print("    {} {}: {}".format(field, problem, count))
+    else:
+        print("没有发现问题")
@@ -0,0 +1,130 @@
+"""按需逐条读取抓取结果.
+
+results.json / items.json(JSON 数组或 NDJSON)和 guangdong_cosmetics_v2.csv 都可以逐条
+读取,不需要先 json.load 或 pd.read_csv 整个文件.读取时可以只保留需要的字段,按
+许可证编号的省份,发证机关(qfManagerName)等条件过滤,也可以按固定条数分批交给
+下游处理.内存占用只和一批的条数有关,不随文件变大而增长.
+
+    python scxk_reader.py results.json --province 粤 --fields productSn epsName xkDate
+    python scxk_reader.py results.json --qf-manager 广东省药品监督管理局 --count
+    python scxk_reader.py nmpa_project/guangdong_cosmetics_v2.csv --match 企业名称=广州 --limit 10
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+from scxk_record import PermitRecord
+from scxk_sink import read_records
+from scxk_store import province_of
+
+# 分批读取时每批的条数
+CHUNK_SIZE = 10000
+
+
+def iter_csv(path: str):
+    """逐行读取 CSV 文件(兼容带 BOM 的 UTF-8),每行是一个字典."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as fp:
+        yield from csv.DictReader(fp)
+
+
+def iter_file(path: str):
+    """按扩展名和文件内容判断格式,逐条读取记录."""
+    if path.lower().endswith(".csv"):
+        return iter_csv(path)
+    return read_records(path)
+
+
+def by_province(*provinces: str, field: str = "productSn"):
+    """许可证编号(默认 productSn)的省份简称是 provinces 之一."""
+    provinces = set(provinces)
+    return lambda record: province_of(record.get(field) or "") in provinces
+
+
+def by_value(field: str, *values):
+    """字段等于 values 之一,例如 by_value("qfManagerName", "广东省药品监督管理局")."""
+    values = set(values)
+    return lambda record: record.get(field) in values
+
+
+def by_prefix(field: str, prefix: str):
+    return lambda record: (record.get(field) or "").startswith(prefix)
+
+
+def by_substring(field: str, text: str):
+    return lambda record: text in (record.get(field) or "")
+
+
+def all_of(*predicates):
+    return lambda record: all(predicate(record) for predicate in predicates)
+
+
+def project(record: dict, fields: list) -> dict:
+    """只保留 fields 里的字段,记录里没有的字段为 None."""
+    return {field: record.get(field) for field in fields}
+
+
+def iter_records(path: str, fields: list = None, where=None, limit: int = None, compact: bool = False):
+    """逐条读取 path 里满足 where 的记录,fields 不为空时只保留这些字段.
+
+    where 是接收一条记录返回真假的函数,可以用 by_province, by_value 等组合.compact 为
+    True 且没有指定 fields 时返回 PermitRecord,需要把大量记录留在内存里时使用.
+    """
+    records = iter_file(path)
+    if compact and not fields:
+        records = map(PermitRecord.from_dict, records)
+    if where is not None:
+        records = filter(where, records)
+    if fields:
+        records = (project(record, fields) for record in records)
+    if limit is not None:
+        records = itertools.islice(records, limit)
+    return records
+
+
+def iter_chunks(records, size: int = CHUNK_SIZE):
+    """把记录按 size 条一批分组,最后一批可能不足 size 条."""
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_frames(path: str, fields: list = None, where=None, chunk_size: int = CHUNK_SIZE):
+    """和 iter_records 一样过滤和选择字段,每批记录转成一个 DataFrame,需要安装 pandas."""
+    import pandas
+
+    for chunk in iter_chunks(iter_records(path, fields, where), chunk_size):
+        yield pandas.DataFrame.from_records(chunk, columns=fields or None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="逐条读取 results.json / items.json / CSV,按条件过滤并输出 NDJSON")
+    parser.add_argument("path", help="JSON 数组,NDJSON 或 CSV 文件")
+    parser.add_argument("--fields", nargs="+", help="只输出这些字段")
+    parser.add_argument("--province", nargs="+", help="许可证编号的省份简称,例如 粤 浙")
+    parser.add_argument("--sn-field", default="productSn", help="许可证编号所在的字段")
+    parser.add_argument("--qf-manager", nargs="+", help="发证机关(qfManagerName)")
+    parser.add_argument("--match", nargs="+", default=[], metavar="字段=文字", help="字段包含这段文字")
+    parser.add_argument("--limit", type=int, help="最多输出的条数")
+    parser.add_argument("--count", action="store_true", help="只输出满足条件的条数")
+    args = parser.parse_args()
+
+    predicates = []
+    if args.province:
+        predicates.append(by_province(*args.province, field=args.sn_field))
+    if args.qf_manager:
+        predicates.append(by_value("qfManagerName", *args.qf_manager))
+    for match in args.match:
+        field, _, text = match.partition("=")
+        predicates.append(by_substring(field, text))
+    records = iter_records(args.path, args.fields, all_of(*predicates) if predicates else None, args.limit)
+    if args.count:
+        print(sum(1 for _ in records))
+    else:
+        for record in records:
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
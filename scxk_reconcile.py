@@ -0,0 +1,198 @@
+"""核对列表页的数据条数和已经取到的 id,找出并补齐缺口.
+
+抓取过程中服务器上的数据可能在变化,翻页时页码边界上的数据会移动,同一个 id 会
+出现在两页里,也会有 id 一页都没出现;新的年份或编号段也可能在规划之后才有数据.
+这里从省份关键字开始核对: 服务器返回的总条数等于日志里这个关键字下去重后的 id 数
+时就不再往下探测,不一致时按 refine_keyword 往下细分,只重新遍历对不上的叶子,
+新出现数据的编号段加为新的叶子.每一轮没有补到新的 id 或者达到轮数上限就停止,
+最后输出覆盖率报告.补到的 id 写回日志,再运行一次 scxk_nmpa_final.py 就会抓取它们的详情.
+
+    python scxk_reconcile.py                    # 核对日志里所有的关键字
+    python scxk_reconcile.py --kw 粤妆 --report coverage.json
+"""
+
+import argparse
+import collections
+import json
+import time
+
+from scxk_journal import JOURNAL_FILE, CrawlJournal
+from scxk_nmpa_final import MAX_PAGE, SN_LENGTH, get_pages, get_pages_status, plan_queries, refine_keyword
+
+# 每个关键字最多核对的轮数
+ROUNDS = 3
+REPORT_FILE = "coverage.json"
+
+
+class Reconciler:
+    """核对一个关键字(例如 粤妆)的查询计划,叶子的 id 列表保存在日志里."""
+
+    def __init__(self, kw: str, journal: CrawlJournal):
+        self.kw = kw
+        self.journal = journal
+        self.leaves = journal.get_plan(kw) or []
+        self.totals = dict()
+        self.requests = 0
+        self.rewalked = list()
+        self.added = list()
+        self.rounds = 0
+
+    def leaf_ids(self, kw: str) -> list:
+        return self.journal.get_leaf(kw) or []
+
+    def fetched_under(self, prefix: str) -> set:
+        """日志里 prefix 下所有叶子去重后的 id."""
+        ids = set()
+        for leaf in self.leaves:
+            if leaf["kw"].startswith(prefix):
+                ids.update(self.leaf_ids(leaf["kw"]))
+        return ids
+
+    def probe(self, kw: str) -> dict:
+        self.requests += 1
+        status = get_pages_status(kw)
+        self.totals[kw] = status["total_count"]
+        return status
+
+    def run(self, rounds: int = ROUNDS) -> dict:
+        """最多核对 rounds 轮,某一轮没有补到新的 id 时提前结束,返回覆盖率报告."""
+        plan = [leaf["kw"] for leaf in self.leaves]
+        for self.rounds in range(1, rounds + 1):
+            if not self.check(self.kw):
+                break
+        if [leaf["kw"] for leaf in self.leaves] != plan:
+            self.journal.save_plan(self.kw, self.leaves)
+        return self.report()
+
+    def check(self, kw: str) -> bool:
+        """核对 kw 的数据条数,不一致时往下细分,返回是否补到了新的 id."""
+        status = self.probe(kw)
+        if any(leaf["kw"] == kw for leaf in self.leaves) or not any(
+                leaf["kw"].startswith(kw) for leaf in self.leaves):
+            return self.check_leaf(kw, status)
+        if status["total_count"] <= len(self.fetched_under(kw)):
+            return False
+        progress = False
+        for child in refine_keyword(kw):
+            progress = self.check(child) or progress
+        return progress
+
+    def check_leaf(self, kw: str, status: dict) -> bool:
+        """重新遍历 id 数少于总条数的叶子,超过页数上限的重新规划,返回是否补到了新的 id."""
+        old = self.leaf_ids(kw)
+        if status["total_count"] <= len(set(old)):
+            # 日志里已经有完整的 id,只是不在查询计划里
+            return self.add_leaf(kw, status)
+        if status["page_count"] > MAX_PAGE and len(kw) < SN_LENGTH:
+            # 数据变多,这个叶子超过页数上限了,换成细分后的叶子
+            cache = {kw: status}
+            leaves = plan_queries(kw, cache)
+            self.requests += len(cache) - 1
+            self.totals.update((key, value["total_count"]) for key, value in cache.items())
+            self.leaves = [leaf for leaf in self.leaves if leaf["kw"] != kw]
+            progress = False
+            for leaf in leaves:
+                progress = self.check_leaf(leaf["kw"], {
+                    "page_count": leaf["page_count"], "total_count": leaf["total_count"], "ids": leaf["first_ids"],
+                    "xk_dates": leaf.get("first_xk_dates", {}),
+                }) or progress
+            return progress
+        ids = status["ids"] + get_pages(min(status["page_count"], MAX_PAGE), kw, start=2)
+        self.requests += max(0, min(status["page_count"], MAX_PAGE) - 1)
+        merged = list(dict.fromkeys(old + ids))
+        self.journal.finish_leaf(kw, merged, status["total_count"])
+        self.rewalked.append(kw)
+        self.add_leaf(kw, status)
+        print("关键词{}重新遍历,{} 条 -> {} 条,服务器 {} 条".format(
+            kw, len(set(old)), len(merged), status["total_count"]))
+        return len(merged) > len(set(old))
+
+    def add_leaf(self, kw: str, status: dict) -> bool:
+        """不在查询计划里但有数据的关键字加为新的叶子,返回是否新加了叶子."""
+        if status["total_count"] == 0 or any(leaf["kw"] == kw for leaf in self.leaves):
+            return False
+        self.leaves.append({
+            "kw": kw,
+            "page_count": status["page_count"],
+            "total_count": status["total_count"],
+            "first_ids": status["ids"],
+            "first_xk_dates": status.get("xk_dates", {}),
+        })
+        self.added.append(kw)
+        return True
+
+    def report(self) -> dict:
+        counts = collections.Counter()
+        gaps = list()
+        for leaf in self.leaves:
+            ids = set(self.leaf_ids(leaf["kw"]))
+            counts.update(ids)
+            total = self.totals.get(leaf["kw"], self.journal.get_leaf_total(leaf["kw"]) or leaf["total_count"])
+            if len(ids) < total:
+                gaps.append({"kw": leaf["kw"], "expected": total, "fetched": len(ids)})
+        kws = sorted(leaf["kw"] for leaf in self.leaves)
+        # 一个叶子是另一个叶子的前缀时,两个查询的范围重叠
+        overlaps = [[a, b] for i, a in enumerate(kws) for b in kws[i + 1:] if b.startswith(a)]
+        # 父关键字的总条数比各个细分关键字的总和多出来的部分,编号格式不符合规律,无法按编号取到
+        unassigned = dict()
+        for kw, total in self.totals.items():
+            children = refine_keyword(kw) if len(kw) < SN_LENGTH else []
+            if children and all(child in self.totals for child in children):
+                missing = total - sum(self.totals[child] for child in children)
+                if missing > 0:
+                    unassigned[kw] = missing
+        expected = self.totals.get(self.kw, 0)
+        fetched = len(counts)
+        return {
+            "kw": self.kw,
+            "expected": expected,
+            "fetched": fetched,
+            "coverage": round(fetched / expected, 4) if expected else 1.0,
+            "complete": fetched >= expected,
+            "duplicates": sum(1 for count in counts.values() if count > 1),
+            "overlaps": overlaps,
+            "gaps": gaps,
+            "unassigned": unassigned,
+            "rewalked": self.rewalked,
+            "added": self.added,
+            "rounds": self.rounds,
+            "requests": self.requests,
+        }
+
+
+def reconcile(kws: list, journal: CrawlJournal, rounds: int = ROUNDS) -> list:
+    reports = list()
+    for kw in kws:
+        report = Reconciler(kw, journal).run(rounds)
+        print("{}: 服务器 {} 条,已取到 {} 条,覆盖率 {:.2%},{} 轮,{} 次请求{}".format(
+            kw, report["expected"], report["fetched"], report["coverage"], report["rounds"], report["requests"],
+            "" if report["complete"] else ",缺口 {}".format(report["gaps"] or report["unassigned"])))
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="核对数据条数,补齐缺口并输出覆盖率报告")
+    parser.add_argument("--kw", nargs="+", help="要核对的关键字,默认为日志里所有有查询计划的关键字")
+    parser.add_argument("--journal", default=JOURNAL_FILE, help="抓取进度日志")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="每个关键字最多核对的轮数")
+    parser.add_argument("--report", default=REPORT_FILE, help="覆盖率报告的保存路径")
+    args = parser.parse_args()
+
+    journal = CrawlJournal(args.journal)
+    start = time.time()
+    reports = reconcile(args.kw or journal.plan_keywords(), journal, args.rounds)
+    expected = sum(report["expected"] for report in reports)
+    fetched = sum(report["fetched"] for report in reports)
+    summary = {
+        "expected": expected,
+        "fetched": fetched,
+        "coverage": round(fetched / expected, 4) if expected else 1.0,
+        "complete": all(report["complete"] for report in reports),
+        "keywords": reports,
+    }
+    with open(args.report, "w", encoding="utf-8") as fp:
+        json.dump(summary, fp, ensure_ascii=False, indent=4)
+    print("总共服务器 {} 条,已取到 {} 条,覆盖率 {:.2%},报告已保存到 {},耗时 {:.1f}s".format(
+        expected, fetched, summary["coverage"], args.report, time.time() - start))
+    journal.close()
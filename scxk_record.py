@@ -0,0 +1,129 @@
+"""占用内存少的许可证详情记录.
+
+详情接口返回的字典有 35 个键,大部分是空字符串,isimport, xkType, qfManagerName,
+rcManagerDepartName 这些字段在所有记录里只有很少几种取值,但每次 json.loads 都会
+创建新的字符串.PermitRecord 用 __slots__ 保存字段,不保存空字段,取值重复的字段
+用 sys.intern 共用同一个字符串对象.和原来的字典可以无损地互相转换.
+
+    python scxk_record.py results.json --repeat 10    # 比较字典和 PermitRecord 的内存占用
+"""
+
+import argparse
+import gc
+import multiprocessing
+import sys
+
+from scxk_metrics import current_rss
+from scxk_sink import read_records
+
+# 详情接口返回的全部字段,和 result.json 一致
+FIELDS = [
+    "businessLicenseNumber", "businessPerson", "certStr", "cityCode", "countyCode", "creatUser",
+    "createTime", "endTime", "epsAddress", "epsName", "epsProductAddress", "id", "isimport",
+    "legalPerson", "offDate", "offReason", "parentid", "preid", "processid", "productSn",
+    "provinceCode", "qfDate", "qfManagerName", "qualityPerson", "rcManagerDepartName",
+    "rcManagerUser", "startTime", "warehouseAddress", "xkCompleteDate", "xkDate", "xkDateStr",
+    "xkName", "xkProject", "xkRemark", "xkType",
+]
+# 等于默认值的字段不保存,读取时按默认值还原;不在这里的字段默认是空字符串
+DEFAULTS = {"xkCompleteDate": None}
+# 取值很少或者经常重复的字段,相同的字符串只保存一份
+INTERNED = {
+    "certStr", "cityCode", "countyCode", "creatUser", "isimport", "offReason", "provinceCode",
+    "qfDate", "qfManagerName", "rcManagerDepartName", "xkDate", "xkDateStr", "xkName", "xkProject",
+    "xkRemark", "xkType",
+}
+
+
+class PermitRecord:
+    """一条许可证详情.没有设置的槽表示字段等于默认值(空字符串)."""
+
+    # _missing: 原来的字典里没有的字段;_extra: 不在 FIELDS 里的字段.两者通常都不设置
+    __slots__ = tuple(FIELDS) + ("_missing", "_extra")
+
+    @classmethod
+    def from_dict(cls, detail: dict) -> "PermitRecord":
+        record = cls()
+        missing = []
+        for key in FIELDS:
+            if key not in detail:
+                missing.append(key)
+                continue
+            value = detail[key]
+            if value == DEFAULTS.get(key, "") and type(value) is type(DEFAULTS.get(key, "")):
+                continue
+            if key in INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(record, key, value)
+        if missing:
+            record._missing = tuple(missing)
+        if len(detail) + len(missing) > len(FIELDS):
+            record._extra = {key: value for key, value in detail.items() if key not in cls.__slots__}
+        return record
+
+    def to_dict(self) -> dict:
+        missing = getattr(self, "_missing", ())
+        detail = {
+            key: getattr(self, key, DEFAULTS.get(key, ""))
+            for key in FIELDS if key not in missing
+        }
+        detail.update(getattr(self, "_extra", {}))
+        return detail
+
+    def get(self, key: str, default=None):
+        if key in FIELDS and key not in getattr(self, "_missing", ()):
+            return getattr(self, key, DEFAULTS.get(key, ""))
+        return getattr(self, "_extra", {}).get(key, default)
+
+    def __getitem__(self, key: str):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PermitRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self) -> str:
+        return "PermitRecord({!r})".format(self.get("productSn"))
+
+
+def compact(detail):
+    """把字典转成 PermitRecord,已经是 PermitRecord 或 None 时原样返回."""
+    if detail is None or isinstance(detail, PermitRecord):
+        return detail
+    return PermitRecord.from_dict(detail)
+
+
+def measure(path: str, repeat: int, compact_records: bool) -> dict:
+    """在当前进程里把 path 的记录读 repeat 遍放在内存里,返回条数和增加的内存."""
+    gc.collect()
+    start = current_rss() or 0
+    records = []
+    for _ in range(repeat):
+        for detail in read_records(path):
+            records.append(PermitRecord.from_dict(detail) if compact_records else detail)
+    gc.collect()
+    return {"records": len(records), "rss_bytes": (current_rss() or 0) - start}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比较字典和 PermitRecord 保存详情数据时的内存占用")
+    parser.add_argument("path", help="results.json / items.json 等详情数据文件")
+    parser.add_argument("--repeat", type=int, default=1, help="把文件重复读取几遍,模拟更大的数据集")
+    args = parser.parse_args()
+
+    # 每种方式在单独的新进程里测量,互不影响
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name, compact_records in (("dict", False), ("PermitRecord", True)):
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(measure, (args.path, args.repeat, compact_records))
+        result = results[name]
+        print("{:<14}{:>10} 条{:>10.1f} MB{:>10.0f} 字节/条".format(
+            name, result["records"], result["rss_bytes"] / 1024 / 1024,
+            result["rss_bytes"] / result["records"] if result["records"] else 0))
+    if results["PermitRecord"]["rss_bytes"] > 0:
+        print("内存占用降低到 1/{:.1f}".format(results["dict"]["rss_bytes"] / results["PermitRecord"]["rss_bytes"]))
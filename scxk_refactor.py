@@ -1,41 +1,23 @@
 """scxk.nmpa 网站上化妆品许可信息的抓取."""
 
-import json
-import os
-import psutil
-import requests
+import argparse
+
+import scxk_aio
+from scxk_aio import print_stats
+from scxk_client import BASE_URL
+from scxk_journal import CrawlJournal
+from scxk_metrics import MetricsReporter, current_rss, get_metrics
+from scxk_record import PermitRecord, compact
+from scxk_sink import JsonSink
 
 
 def get_id_by_num(num: int) -> list:
     id_list = []
-    url = "http://scxk.nmpa.gov.cn:81/xk/itownet/portalAction.do?method=getXkzsList"
-    headers = {
-        'Origin':
-            'http://scxk.nmpa.gov.cn:81',
-        'Referer':
-            'http://scxk.nmpa.gov.cn:81/xk/',
-        'User-Agent':
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36',
-    }
 
     for page_index in range(1, 51):
-        data = {
-            'on': 'true',
-            'page': page_index,
-            'pageSize': '15',
-            'productName': num,
-            'conditionType': '1',
-            'applyname': '',
-            'applysn': '',
-        }
-
         # print('index{}num{}'.format(page_index, num))
-        ids_json = {}
-        try:
-            ids_json = requests.post(url=url, data=data, headers=headers).json()
-        except:
-            ids_json['list'] = []
-        # print(ids_json['list'])
+        # 请求失败会在客户端里重试,重试用完后抛出异常,不能当成没有数据
+        ids_json = scxk_aio.run(scxk_aio.get_list(num, page_index))
 
         if ids_json['list'] == []:
             # print("{} page {}can't get info".format(num, page_index))
@@ -45,39 +27,23 @@ def get_id_by_num(num: int) -> list:
 
         for di in ids_json['list']:
             id_list.append(di['ID'])
+        get_metrics().inc('ids_total', len(ids_json['list']))
 
     return id_list
 
 
 def get_max_num(num: int) -> int:
 
-    url = "http://scxk.nmpa.gov.cn:81/xk/itownet/portalAction.do?method=getXkzsList"
-    headers = {
-        'Origin':
-            'http://scxk.nmpa.gov.cn:81',
-        'Referer':
-            'http://scxk.nmpa.gov.cn:81/xk/',
-        'User-Agent':
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36',
-    }
-    data = {
-        'on': 'true',
-        'page': 1,
-        'pageSize': '15',
-        'productName': num,
-        'conditionType': '1',
-        'applyname': '',
-        'applysn': '',
-    }
-    response = requests.post(url, headers=headers, data=data)
-    max_num = response.json()['totalCount']
-    print(response.json())
+    result = scxk_aio.run(scxk_aio.get_list(num, 1))
+    max_num = result['totalCount']
+    print(result)
     print(num)
 
     return max_num
 
 
-def get_id_all(url: str) -> list:
+def get_id_all(url: str, journal: CrawlJournal = None) -> list:
+    """传入 journal 时,每个编号查询到的 id 会记录到日志里,重新运行时直接读取."""
     id_list = []
     # 网页上最多只显示50页数据
     # 按许可编号查询，许可编号规律：年份+编号(1-9999)
@@ -88,7 +54,11 @@ def get_id_all(url: str) -> list:
         max_num = get_max_num(int(year / 10000))
 
         for num in range(1, max_num):
-            num_ids = get_id_by_num(year + num)
+            num_ids = journal.get_leaf(str(year + num)) if journal is not None else None
+            if num_ids is None:
+                num_ids = get_id_by_num(year + num)
+                if journal is not None:
+                    journal.finish_leaf(str(year + num), num_ids)
 
             if num_ids == []:
                 break_count = break_count + 1
@@ -99,10 +69,7 @@ def get_id_all(url: str) -> list:
         if break_count == 100:
             break
 
-    print(u'当前占用:%.4f GB' %
-          (psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024 / 1024))
-
-    # json.dump(id_list, open('ids.json', 'w'))
+    print(u'当前占用:%.4f GB' % ((current_rss() or 0) / 1024 / 1024 / 1024))
 
     return id_list
 
@@ -115,53 +82,52 @@ def get_item_info(id: str) -> dict:
     :param: id:  id of asd
 
      """
-    url_info = "http://scxk.nmpa.gov.cn:81/xk/itownet/portalAction.do?method=getXkzsById"
     headers = {
-        'Origin':
-            'http://scxk.nmpa.gov.cn:81',
         'Referer':
-            'http://scxk.nmpa.gov.cn:81/xk/itownet/portal/dzpz.jsp?id=' + id,
-        'User-Agent':
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36',
+            BASE_URL + '/xk/itownet/portal/dzpz.jsp?id=' + id,
     }
-    data = {
-        'id': id,
-    }
-    response = requests.post(url_info, headers=headers, data=data)
-
-    item_info: dict = response.json()
+    item_info: dict = scxk_aio.run(scxk_aio.get_detail(id, headers=headers))
 
     return item_info
 
 
+def fetch_item_info(id: str, journal: CrawlJournal) -> PermitRecord:
+    """日志里已有的详情直接返回,新抓取的详情写入日志."""
+    item_info = journal.get_detail(id)
+    if item_info is None:
+        item_info = get_item_info(id)
+        journal.save_detail(id, item_info)
+    get_metrics().inc('details_total')
+    return compact(item_info)
+
+
 def store_item_info(info: dict) -> None:
     pass
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='按许可编号抓取 scxk.nmpa 上的化妆品生产许可信息')
+    parser.add_argument('--metrics', help='定期把性能统计写到这个文件,以 .prom 结尾时为 Prometheus 文本格式,否则为 JSON')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='性能统计的写入间隔(秒)')
+    args = parser.parse_args()
     url_id = "http://scxk.nmpa.gov.cn:81/xk/itownet/portalAction.do?method=getXkzsList"
 
-    # 下面的运行一次，将所有id存到本地ids.json
-    id_list: list = get_id_all(url_id)
+    # 已经查询过的编号和详情都记录在日志里,中断后重新运行会从中断处继续
+    journal = CrawlJournal()
+    # 指定 --metrics 时才定期写性能统计
+    reporter = MetricsReporter(get_metrics(), args.metrics, args.metrics_interval).start()
+    id_list: list = get_id_all(url_id, journal)
     print(len(id_list))
-    json.dump(id_list, open('ids.json', 'w'), ensure_ascii=False)
-
-    # id_list: list = json.load(open('ids.json', 'r'))
-    # print(len(id_list))
-    # print(type(id_list[0]))
-    # print(get_item_info(id_list[0]))
-
-    fp = open('items.json', 'a')
-    fp.write('[')
-    for id in id_list[:-1]:
-        try:
-            item_info = get_item_info(id)
-        except Exception as e:
-            print('{}error{}'.format(id, e))
-        print(item_info)
-        json.dump(item_info, fp, ensure_ascii=False)
-        fp.write(',')
-        print(id)
-    item_info = get_item_info(id_list[-1])
-    json.dump(item_info, fp, ensure_ascii=False)
-    fp.write(']')
+
+    with JsonSink('items.json') as sink:
+        for id in id_list:
+            try:
+                item_info = fetch_item_info(id, journal)
+            except Exception as e:
+                print('{}error{}'.format(id, e))
+                continue
+            sink.write(item_info)
+            print(id)
+    print_stats()
+    reporter.stop()
+    journal.close()
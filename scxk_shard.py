@@ -0,0 +1,278 @@
+"""按省份分片,多进程并行抓取.
+
+scxk_nmpa_final.py 按顺序一个省份一个省份地抓取,粤的数据超过 50 页,占了大部分时间.
+这里先把抓取任务拆成互不相关的分片: 每个省份一个分片,超过 50 页的省份按年份拆成
+"粤妆2016" 这样的多个分片.分片放在一个 SQLite 队列文件里,多个进程(也可以是共享
+这个文件的多台机器)各自领取分片抓取,结果写到各自的 NDJSON 文件,最后按许可证编号
+去重合并成 results.json.数据多的分片先领取,总耗时接近最大的那个分片.
+
+    python scxk_shard.py run --workers 4
+    python scxk_shard.py seed                 # 只生成分片
+    python scxk_shard.py work --workers 4     # 在每台机器上运行,领取并抓取分片
+    python scxk_shard.py merge                # 合并结果
+    python scxk_shard.py status
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+
+QUEUE_FILE = "crawl_queue.db"
+SHARD_DIR = "shards"
+OUTPUT_FILE = "results.json"
+# 领取后超过这么多秒没有续期的分片认为进程已经退出,可以被重新领取
+LEASE = 3600
+# 抓取过程中每隔这么多秒续期一次
+RENEW_INTERVAL = 60
+WORKERS = 4
+
+
+class LeaseLost(Exception):
+    """分片的租期已过,被其他进程重新领取了."""
+
+
+class ShardQueue:
+    """保存在 SQLite 里的分片队列,多个进程可以同时领取."""
+
+    def __init__(self, path: str = QUEUE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                kw TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                total_count INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                started REAL,
+                finished REAL,
+                count INTEGER,
+                error TEXT,
+                heartbeat REAL
+            )
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(shards)")]
+        if "heartbeat" not in columns:
+            # 旧版本的队列文件没有续期时间这一列
+            self.conn.execute("ALTER TABLE shards ADD COLUMN heartbeat REAL")
+
+    def add(self, kw: str, seq: int, total_count: int) -> None:
+        """加入一个分片,已经存在时保留原来的状态."""
+        self.conn.execute("INSERT OR IGNORE INTO shards (kw, seq, total_count) VALUES (?, ?, ?)",
+                          (kw, seq, total_count))
+
+    def reset_failed(self) -> int:
+        return self.conn.execute("UPDATE shards SET status = 'pending', error = NULL WHERE status = 'failed'").rowcount
+
+    def claim(self, worker: str, lease: float = LEASE):
+        """领取一个待抓取的分片(数据多的优先),没有时返回 None."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("""
+                SELECT kw FROM shards
+                WHERE status = 'pending' OR (status = 'running' AND COALESCE(heartbeat, started) < ?)
+                ORDER BY total_count DESC, seq LIMIT 1
+            """, (now - lease,)).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "UPDATE shards SET status = 'running', worker = ?, started = ?, heartbeat = ? WHERE kw = ?",
+                    (worker, now, now, row[0]))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row[0] if row else None
+
+    def renew(self, kw: str, worker: str) -> bool:
+        """延长 worker 领取的分片的租期,分片已经不属于 worker 时返回 False."""
+        return self.conn.execute(
+            "UPDATE shards SET heartbeat = ? WHERE kw = ? AND worker = ? AND status = 'running'",
+            (time.time(), kw, worker)).rowcount > 0
+
+    def finish(self, kw: str, worker: str, count: int) -> bool:
+        """标记分片完成,分片已经被其他进程重新领取时不修改,返回 False."""
+        return self.conn.execute(
+            "UPDATE shards SET status = 'done', finished = ?, count = ? WHERE kw = ? AND worker = ? AND status = 'running'",
+            (time.time(), count, kw, worker)).rowcount > 0
+
+    def fail(self, kw: str, worker: str, error: str) -> bool:
+        return self.conn.execute(
+            "UPDATE shards SET status = 'failed', finished = ?, error = ? WHERE kw = ? AND worker = ? AND status = 'running'",
+            (time.time(), error, kw, worker)).rowcount > 0
+
+    def shards(self) -> list:
+        """所有分片,按生成的顺序."""
+        columns = ["kw", "seq", "total_count", "status", "worker", "started", "finished", "count", "error"]
+        rows = self.conn.execute("SELECT {} FROM shards ORDER BY seq".format(", ".join(columns)))
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def shard_file(kw: str, shard_dir: str = SHARD_DIR) -> str:
+    return os.path.join(shard_dir, kw + ".ndjson")
+
+
+def seed(queue: ShardQueue, kws: list) -> None:
+    """探测每个关键字的数据量,超过页数上限的按年份拆开,加入队列."""
+    from scxk_nmpa_final import MAX_PAGE, get_pages_status, refine_keyword
+
+    seq = len(queue.shards())
+    for kw in kws:
+        status = get_pages_status(kw)
+        if status["total_count"] == 0:
+            continue
+        children = [kw]
+        if status["page_count"] > MAX_PAGE:
+            children = refine_keyword(kw)
+        for child in children:
+            total_count = status["total_count"] if child == kw else get_pages_status(child)["total_count"]
+            if total_count:
+                queue.add(child, seq, total_count)
+                seq += 1
+                print("分片 {}: {} 条".format(child, total_count))
+
+
+def work(queue_path: str = QUEUE_FILE, shard_dir: str = SHARD_DIR, rate: float = None, journal_path: str = None) -> int:
+    """反复领取分片并抓取,直到队列里没有分片,返回完成的分片数.
+
+    rate 不为空时替换本进程限速器的每秒请求数.每个进程有自己的连接池和限速器.
+    抓取过程中定期续期;结果先写到本进程自己的临时文件,分片完成时才替换成分片文件,
+    租期过了被其他进程接手时放弃这个分片,不会和新的进程写同一个文件.
+    """
+    from scxk_aio import get_client
+    from scxk_journal import JOURNAL_FILE, CrawlJournal
+    from scxk_limiter import RateLimiter
+    from scxk_nmpa_final import crawl_pipeline
+    from scxk_sink import JsonSink
+
+    if rate:
+        get_client().limiter = RateLimiter(rate=rate, burst=max(1, int(rate)))
+    worker = "{}:{}".format(socket.gethostname(), os.getpid())
+    queue = ShardQueue(queue_path)
+    journal = CrawlJournal(journal_path or JOURNAL_FILE)
+    os.makedirs(shard_dir, exist_ok=True)
+    done = 0
+    while True:
+        kw = queue.claim(worker)
+        if kw is None:
+            break
+        start = time.time()
+        print("[{}] 开始抓取分片 {}".format(worker, kw))
+        tmp_file = "{}.{}.tmp".format(shard_file(kw, shard_dir), os.getpid())
+        try:
+            renewed = time.time()
+            # 中途放弃分片时关闭流水线,后台遍历列表页的线程也会退出
+            with JsonSink(tmp_file, fmt="ndjson") as sink, \
+                    contextlib.closing(crawl_pipeline([kw], journal=journal)) as details:
+                for detail in details:
+                    sink.write(detail)
+                    if time.time() - renewed >= RENEW_INTERVAL:
+                        if not queue.renew(kw, worker):
+                            raise LeaseLost(kw)
+                        renewed = time.time()
+        except LeaseLost:
+            print("[{}] 分片 {} 的租期已过,已被其他进程接手,放弃".format(worker, kw))
+            os.remove(tmp_file)
+            continue
+        except Exception as e:
+            print("[{}] 分片 {} 失败: {}".format(worker, kw, e))
+            queue.fail(kw, worker, repr(e))
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            continue
+        # 先确认分片还属于自己再替换文件,替换之后才标记完成
+        if not queue.renew(kw, worker):
+            print("[{}] 分片 {} 的租期已过,已被其他进程接手,放弃".format(worker, kw))
+            os.remove(tmp_file)
+            continue
+        os.replace(tmp_file, shard_file(kw, shard_dir))
+        queue.finish(kw, worker, sink.count)
+        done += 1
+        print("[{}] 分片 {} 完成,{} 条,耗时 {:.1f}s".format(worker, kw, sink.count, time.time() - start))
+    journal.close()
+    queue.close()
+    return done
+
+
+def run_workers(workers: int, queue_path: str = QUEUE_FILE, shard_dir: str = SHARD_DIR, rate: float = None) -> None:
+    """用 workers 个进程同时领取分片;rate 是所有进程合计的每秒请求数."""
+    per_worker = rate / workers if rate else None
+    # 用 spawn 启动,子进程不会继承父进程里已经打开的连接和数据库
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        pool.starmap(work, [(queue_path, shard_dir, per_worker)] * workers)
+
+
+def record_key(detail: dict) -> str:
+    """合并去重用的键: 许可证编号,没有时用内容的哈希."""
+    if detail.get("productSn"):
+        return detail["productSn"]
+    return hashlib.sha1(json.dumps(detail, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def merge(queue: ShardQueue, shard_dir: str = SHARD_DIR, output_file: str = OUTPUT_FILE) -> int:
+    """按分片顺序合并所有已完成分片的结果,去掉重复的许可证,返回写入的条数."""
+    from scxk_sink import JsonSink, read_records
+
+    seen = set()
+    duplicates = 0
+    with JsonSink(output_file, indent=4, sort_keys=True) as sink:
+        for shard in queue.shards():
+            if shard["status"] != "done":
+                print("分片 {} 还没有完成({}),跳过".format(shard["kw"], shard["status"]))
+                continue
+            for detail in read_records(shard_file(shard["kw"], shard_dir)):
+                key = record_key(detail)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                sink.write(detail)
+    print("合并 {} 条到 {},去掉重复 {} 条".format(sink.count, output_file, duplicates))
+    return sink.count
+
+
+def print_status(queue: ShardQueue) -> None:
+    counts = {}
+    for shard in queue.shards():
+        counts[shard["status"]] = counts.get(shard["status"], 0) + 1
+        elapsed = (shard["finished"] or time.time()) - shard["started"] if shard["started"] else 0
+        print("{:<12}{:<10}{:>8}{:>8}{:>10.1f}s  {}".format(
+            shard["kw"], shard["status"], shard["total_count"], shard["count"] or 0, elapsed,
+            shard["error"] or shard["worker"] or ""))
+    print(counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按省份分片,多进程并行抓取")
+    parser.add_argument("command", choices=["run", "seed", "work", "merge", "status"])
+    parser.add_argument("--queue", default=QUEUE_FILE, help="分片队列文件,多台机器共享这个文件")
+    parser.add_argument("--shard-dir", default=SHARD_DIR, help="各分片结果的目录")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="本机同时抓取的进程数")
+    parser.add_argument("--rate", type=float, help="本机所有进程合计的每秒请求数,默认每个进程使用客户端的默认值")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="合并后的结果文件")
+    args = parser.parse_args()
+
+    queue = ShardQueue(args.queue)
+    start = time.time()
+    if args.command in ("run", "seed"):
+        from scxk_nmpa_final import cities
+        queue.reset_failed()
+        seed(queue, [city + "妆" for city in cities])
+    if args.command in ("run", "work"):
+        run_workers(args.workers, args.queue, args.shard_dir, args.rate)
+    if args.command in ("run", "merge"):
+        merge(queue, args.shard_dir, args.output)
+    if args.command in ("run", "status"):
+        print_status(queue)
+    print("耗时 {:.1f}s".format(time.time() - start))
+    queue.close()
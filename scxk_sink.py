@@ -0,0 +1,157 @@
+"""详情数据的流式输出.
+
+抓到一条详情就写一条,不在内存里攒整个数据集.输出格式可以是每行一条记录的
+NDJSON,也可以是 JSON 数组;JSON 数组格式下每次刷新到磁盘后文件末尾都是完整的
+"]",程序中途退出时留下的文件也能正常解析.
+"""
+
+import json
+import time
+
+# 攒够多少条记录写一次磁盘
+BATCH_SIZE = 100
+# 距离上次写磁盘超过多少秒也要写一次
+FLUSH_INTERVAL = 5.0
+# 增量读取文件时每次读取的字符数
+CHUNK_SIZE = 64 * 1024
+
+
+class JsonSink:
+    """逐条写入记录的输出文件,fmt 为 "json" (JSON 数组) 或 "ndjson"."""
+
+    def __init__(self, path: str, fmt: str = "json", indent: int = None, sort_keys: bool = False,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        if fmt not in ("json", "ndjson"):
+            raise ValueError("不支持的输出格式: {}".format(fmt))
+        if fmt == "ndjson" and indent is not None:
+            raise ValueError("ndjson 格式每行一条记录,不能缩进")
+        self.path = path
+        self.fmt = fmt
+        self.indent = indent
+        self.sort_keys = sort_keys
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.count = 0
+        self.buffer = list()
+        self.last_flush = time.time()
+        self.fp = open(path, "wb")
+        if fmt == "json":
+            # 写入位置停在 "]" 之前,后面的记录会覆盖掉它再重新写上
+            self.fp.write(b"[\n]")
+            self.fp.seek(1)
+
+    def _encode(self, record) -> str:
+        if hasattr(record, "to_dict"):
+            # scxk_record.PermitRecord 先还原成字典
+            record = record.to_dict()
+        text = json.dumps(record, ensure_ascii=False, indent=self.indent, sort_keys=self.sort_keys)
+        if self.fmt == "ndjson":
+            return text + "\n"
+        prefix = "\n" if self.count == 0 and not self.buffer else ",\n"
+        if self.indent is None:
+            return prefix + text
+        # 和 json.dump(整个列表, indent=indent) 的缩进保持一致
+        pad = " " * self.indent
+        return prefix + pad + text.replace("\n", "\n" + pad)
+
+    def write(self, record) -> None:
+        self.buffer.append(self._encode(record))
+        if len(self.buffer) >= self.batch_size or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            data = "".join(self.buffer).encode("utf-8")
+            self.count += len(self.buffer)
+            self.buffer = list()
+            if self.fmt == "json":
+                # 记录和结尾的 "]" 一次写入,文件在任何时刻都是完整的数组
+                pos = self.fp.tell()
+                self.fp.write(data + b"\n]")
+                self.fp.seek(pos + len(data))
+            else:
+                self.fp.write(data)
+        self.fp.flush()
+        self.last_flush = time.time()
+
+    def close(self) -> None:
+        if self.fp.closed:
+            return
+        self.flush()
+        if self.fmt == "json":
+            self.fp.seek(0, 2)
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_json_array(fp, chunk_size: int = CHUNK_SIZE):
+    """从 JSON 数组文件里逐条读取记录,不把整个文件读进内存.
+
+    数组的元素需要是对象或数组(抓取的结果都是字典),这样被分块截断的元素一定
+    会解析失败,而不会被误解析成一个更短的值.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")):
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("JSON 数组没有结束")
+            more()
+            continue
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("文件不是 JSON 数组")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more()
+            continue
+        pos = end
+        yield record
+
+
+def iter_ndjson(fp):
+    """从 NDJSON 文件里逐行读取记录,跳过空行."""
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_records(path: str):
+    """按文件内容自动判断格式,逐条读取 JsonSink 写出的记录."""
+    with open(path, "r", encoding="utf-8") as fp:
+        head = fp.read(1)
+        while head and head.isspace():
+            head = fp.read(1)
+        fp.seek(0)
+        if head == "[":
+            yield from iter_json_array(fp)
+        else:
+            yield from iter_ndjson(fp)
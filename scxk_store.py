@@ -0,0 +1,334 @@
+"""许可证数据的紧凑存储和查询.
+
+把 results.json / items.json 导入一个 SQLite 数据库: 常用来查询的字段单独成列并建
+索引,发证机关,许可类型,省份,许可项目这些经常重复的字段存成字典表里的编号,其余
+字段里和默认值(空字符串)不一样的才放进一个 JSON 列,空字段不占空间.查询时按许可证编号,
+社会信用代码,企业名称前缀和有效期范围走索引,不用再把整个 JSON 文件读进内存.
+许可项目(certStr)拆成 (单元, 类别) 后建了倒排索引,可以直接查有某个生产能力的企业,
+每次导入时只更新导入的这些许可证的索引.
+
+    python scxk_store.py ingest results.json items.json
+    python scxk_store.py query --sn 闽妆20170002
+    python scxk_store.py query --eps 广州市 --expires-from 2026-01-01 --expires-to 2026-12-31
+    python scxk_store.py query --unit 粉单元 --category 散粉类 --province 粤
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from scxk_certs import parse_cert_str
+from scxk_record import DEFAULTS, FIELDS, PermitRecord
+from scxk_sink import read_records
+
+STORE_FILE = "permits.db"
+# 单独成列的字段: 字段名 -> 列名
+COLUMNS = {
+    "productSn": "product_sn",
+    "businessLicenseNumber": "business_license_number",
+    "epsName": "eps_name",
+    "xkDate": "xk_date",
+    "xkDateStr": "xk_date_str",
+}
+# 取值很少或者经常重复的字段,存成 strings 表里的编号
+DICT_COLUMNS = {
+    "qfManagerName": "qf_manager_name",
+    "xkType": "xk_type",
+    "rcManagerDepartName": "rc_manager_depart_name",
+    "certStr": "cert_str",
+}
+BATCH_SIZE = 1000
+# 一条 SQL 里最多使用的参数个数,老版本的 SQLite 上限是 999
+MAX_VARIABLES = 500
+
+
+def province_of(product_sn: str) -> str:
+    """许可证编号开头的省份简称,例如 "粤妆20160001" -> "粤"."""
+    if len(product_sn) >= 2 and product_sn[1] == "妆":
+        return product_sn[0]
+    return ""
+
+
+class PermitStore:
+    """许可证数据库,导入详情数据并按索引查询."""
+
+    def __init__(self, path: str = STORE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS strings (
+                id INTEGER PRIMARY KEY,
+                value TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS permits (
+                id INTEGER PRIMARY KEY,
+                product_sn TEXT NOT NULL UNIQUE,
+                province INTEGER,
+                business_license_number TEXT,
+                eps_name TEXT,
+                xk_date TEXT,
+                xk_date_str TEXT,
+                qf_manager_name INTEGER,
+                xk_type INTEGER,
+                rc_manager_depart_name INTEGER,
+                cert_str INTEGER,
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS permits_license ON permits (business_license_number);
+            CREATE INDEX IF NOT EXISTS permits_eps_name ON permits (eps_name);
+            CREATE INDEX IF NOT EXISTS permits_xk_date ON permits (xk_date);
+            CREATE INDEX IF NOT EXISTS permits_province ON permits (province);
+            -- 许可项目的倒排索引,没有类别时 category 为 0
+            CREATE TABLE IF NOT EXISTS cert_index (
+                unit INTEGER NOT NULL,
+                category INTEGER NOT NULL,
+                permit INTEGER NOT NULL,
+                PRIMARY KEY (unit, category, permit)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS cert_index_category ON cert_index (category);
+            CREATE INDEX IF NOT EXISTS cert_index_permit ON cert_index (permit);
+        """)
+        self.conn.commit()
+        self.string_ids = dict(self.conn.execute("SELECT value, id FROM strings"))
+        self.string_values = {id: value for value, id in self.string_ids.items()}
+        if self.count() and not self.conn.execute("SELECT 1 FROM cert_index LIMIT 1").fetchone():
+            self.rebuild_cert_index()
+
+    def _string_id(self, value):
+        if value in (None, ""):
+            return None
+        id = self.string_ids.get(value)
+        if id is None:
+            id = self.conn.execute("INSERT INTO strings (value) VALUES (?)", (value,)).lastrowid
+            self.string_ids[value] = id
+            self.string_values[id] = value
+        return id
+
+    def _encode(self, record: dict) -> tuple:
+        extra = {
+            key: value for key, value in record.items()
+            if key not in COLUMNS and key not in DICT_COLUMNS and value != DEFAULTS.get(key, "")
+        }
+        return (
+            record["productSn"],
+            self._string_id(province_of(record["productSn"])),
+            *(record.get(key) or None for key in list(COLUMNS)[1:]),
+            *(self._string_id(record.get(key)) for key in DICT_COLUMNS),
+            json.dumps(extra, ensure_ascii=False, separators=(",", ":")) if extra else None,
+        )
+
+    def _decode(self, row: tuple) -> dict:
+        product_sn, _, *rest = row
+        values = rest[:len(COLUMNS) - 1]
+        dict_ids = rest[len(COLUMNS) - 1:len(COLUMNS) - 1 + len(DICT_COLUMNS)]
+        extra = rest[-1]
+        record = {"productSn": product_sn}
+        record.update((key, value or "") for key, value in zip(list(COLUMNS)[1:], values))
+        record.update((key, self.string_values.get(id, "")) for key, id in zip(DICT_COLUMNS, dict_ids))
+        if extra:
+            record.update(json.loads(extra))
+        for key in FIELDS:
+            record.setdefault(key, DEFAULTS.get(key, ""))
+        return record
+
+    def ingest(self, records, batch_size: int = BATCH_SIZE) -> int:
+        """导入详情数据,许可证编号已经存在时覆盖,返回导入的条数."""
+        count = 0
+        batch = []
+        for record in records:
+            if not record.get("productSn"):
+                continue
+            if isinstance(record, PermitRecord):
+                record = record.to_dict()
+            batch.append(record)
+            if len(batch) >= batch_size:
+                self._write_batch(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+            count += len(batch)
+        self.conn.commit()
+        return count
+
+    def _write_batch(self, records: list) -> None:
+        columns = ["product_sn", "province"] + list(COLUMNS.values())[1:] + list(DICT_COLUMNS.values()) + ["extra"]
+        # 用 upsert 而不是 INSERT OR REPLACE,已有的许可证保留原来的 id,倒排索引不会失效
+        sql = "INSERT INTO permits ({}) VALUES ({}) ON CONFLICT (product_sn) DO UPDATE SET {}".format(
+            ", ".join(columns), ", ".join("?" * len(columns)),
+            ", ".join("{0} = excluded.{0}".format(c) for c in columns[1:]))
+        self.conn.executemany(sql, [self._encode(record) for record in records])
+        self._index_certs(records)
+
+    def _permit_ids(self, product_sns: list) -> dict:
+        ids = {}
+        for i in range(0, len(product_sns), MAX_VARIABLES):
+            chunk = product_sns[i:i + MAX_VARIABLES]
+            ids.update(self.conn.execute("SELECT product_sn, id FROM permits WHERE product_sn IN ({})".format(
+                ", ".join("?" * len(chunk))), chunk))
+        return ids
+
+    def _index_certs(self, records: list) -> None:
+        """更新 records 的许可项目倒排索引: 先删掉这些许可证原来的索引,再写入新的."""
+        ids = self._permit_ids([record["productSn"] for record in records])
+        self.conn.executemany("DELETE FROM cert_index WHERE permit = ?", [(id,) for id in ids.values()])
+        rows = []
+        for record in records:
+            permit = ids[record["productSn"]]
+            for unit, category in parse_cert_str(record.get("certStr")):
+                rows.append((self._string_id(unit), self._string_id(category) or 0, permit))
+        self.conn.executemany("INSERT OR IGNORE INTO cert_index (unit, category, permit) VALUES (?, ?, ?)", rows)
+
+    def rebuild_cert_index(self) -> None:
+        """按已经导入的数据重建整个许可项目索引."""
+        self.conn.execute("DELETE FROM cert_index")
+        rows = []
+        for permit, cert_str in self.conn.execute("SELECT id, cert_str FROM permits WHERE cert_str IS NOT NULL").fetchall():
+            for unit, category in parse_cert_str(self.string_values.get(cert_str)):
+                rows.append((self._string_id(unit), self._string_id(category) or 0, permit))
+        self.conn.executemany("INSERT OR IGNORE INTO cert_index (unit, category, permit) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+
+    def _select(self, where: str, args: tuple, limit: int = None) -> list:
+        sql = "SELECT product_sn, province, {}, {}, extra FROM permits WHERE {} ORDER BY product_sn".format(
+            ", ".join(list(COLUMNS.values())[1:]), ", ".join(DICT_COLUMNS.values()), where)
+        if limit:
+            sql += " LIMIT {:d}".format(limit)
+        return [self._decode(row) for row in self.conn.execute(sql, args)]
+
+    def by_product_sn(self, product_sn: str):
+        """许可证编号对应的详情数据,没有时返回 None."""
+        rows = self._select("product_sn = ?", (product_sn,))
+        return rows[0] if rows else None
+
+    def by_license(self, business_license_number: str) -> list:
+        """同一个社会信用代码下的所有许可证."""
+        return self._select("business_license_number = ?", (business_license_number,))
+
+    def by_eps_prefix(self, prefix: str, limit: int = None) -> list:
+        """企业名称以 prefix 开头的许可证,用范围查询走索引."""
+        return self._select("eps_name >= ? AND eps_name < ?", (prefix, prefix + "\U0010ffff"), limit)
+
+    def expiring_between(self, start: str = None, end: str = None, province: str = None, limit: int = None) -> list:
+        """有效期(xkDate)在 start 和 end 之间(包含两端,格式 YYYY-MM-DD)的许可证."""
+        conditions, args = [], []
+        if start:
+            conditions.append("xk_date >= ?")
+            args.append(start)
+        if end:
+            conditions.append("xk_date <= ?")
+            args.append(end)
+        if province:
+            conditions.append("province = ?")
+            args.append(self.string_ids.get(province, -1))
+        return self._select(" AND ".join(conditions) or "1", tuple(args), limit)
+
+    def by_capability(self, unit: str = None, category: str = None, province: str = None,
+                      expires_from: str = None) -> list:
+        """有某个许可单元和/或类别的许可证,返回许可证编号,企业名称,省份和有效期.
+
+        expires_from 不为空时只返回有效期在这一天之后(包含)的许可证.
+        """
+        conditions, args = [], []
+        for column, value in (("c.unit", unit), ("c.category", category), ("p.province", province)):
+            if value:
+                id = self.string_ids.get(value)
+                if id is None:
+                    return []
+                conditions.append(column + " = ?")
+                args.append(id)
+        if expires_from:
+            conditions.append("p.xk_date >= ?")
+            args.append(expires_from)
+        sql = """
+            SELECT DISTINCT p.product_sn, p.eps_name, p.province, p.xk_date
+            FROM cert_index c JOIN permits p ON p.id = c.permit
+            WHERE {} ORDER BY p.product_sn
+        """.format(" AND ".join(conditions) or "1")
+        return [
+            {"productSn": sn, "epsName": eps_name or "", "province": self.string_values.get(province, ""),
+             "xkDate": xk_date or ""}
+            for sn, eps_name, province, xk_date in self.conn.execute(sql, args)
+        ]
+
+    def capabilities(self) -> list:
+        """所有的 (单元, 类别, 许可证数量),按单元和类别排序."""
+        rows = self.conn.execute("SELECT unit, category, COUNT(*) FROM cert_index GROUP BY unit, category")
+        return sorted((self.string_values[unit], self.string_values.get(category, ""), count)
+                      for unit, category, count in rows)
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM permits").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def ingest_files(store: PermitStore, paths: list) -> None:
+    for path in paths:
+        start = time.time()
+        count = store.ingest(read_records(path))
+        print("{}: 导入 {} 条,耗时 {:.1f}s".format(path, count, time.time() - start))
+    store.conn.execute("VACUUM")
+    # WAL 模式下刚写入的页面还在 -wal 文件里,先合并回数据库文件再看大小
+    store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    json_size = sum(os.path.getsize(path) for path in paths)
+    db_size = os.path.getsize(store.path)
+    print("数据库共 {} 条,{:.1f} MB,JSON 文件共 {:.1f} MB".format(
+        store.count(), db_size / 1024 / 1024, json_size / 1024 / 1024))
+
+
+def query(store: PermitStore, args) -> list:
+    if args.unit or args.category:
+        return store.by_capability(args.unit, args.category, args.province, args.expires_from)
+    if args.sn:
+        record = store.by_product_sn(args.sn)
+        return [record] if record else []
+    if args.license:
+        return store.by_license(args.license)
+    if args.eps:
+        records = store.by_eps_prefix(args.eps)
+        if args.expires_from or args.expires_to:
+            records = [r for r in records
+                       if (not args.expires_from or r["xkDate"] >= args.expires_from)
+                       and (not args.expires_to or r["xkDate"] <= args.expires_to)]
+        return records[:args.limit] if args.limit else records
+    return store.expiring_between(args.expires_from, args.expires_to, args.province, args.limit)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="许可证数据的紧凑存储和查询")
+    parser.add_argument("--db", default=STORE_FILE, help="数据库文件")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="导入 results.json / items.json 等详情数据文件")
+    ingest_parser.add_argument("files", nargs="+")
+    query_parser = commands.add_parser("query", help="查询许可证,结果按 JSON 输出")
+    query_parser.add_argument("--sn", help="许可证编号")
+    query_parser.add_argument("--license", help="社会信用代码")
+    query_parser.add_argument("--eps", help="企业名称前缀")
+    query_parser.add_argument("--province", help="省份简称,和有效期范围一起使用")
+    query_parser.add_argument("--expires-from", help="有效期起始日期 YYYY-MM-DD")
+    query_parser.add_argument("--expires-to", help="有效期截止日期 YYYY-MM-DD")
+    query_parser.add_argument("--limit", type=int, help="最多输出的条数")
+    query_parser.add_argument("--unit", help="许可单元,例如 粉单元")
+    query_parser.add_argument("--category", help="许可类别,例如 散粉类")
+    commands.add_parser("units", help="列出所有的许可单元和类别以及各自的许可证数量")
+    args = parser.parse_args()
+
+    store = PermitStore(args.db)
+    if args.command == "ingest":
+        ingest_files(store, args.files)
+    elif args.command == "units":
+        for unit, category, count in store.capabilities():
+            print("{}\t{}\t{}".format(unit, category, count))
+    else:
+        start = time.perf_counter()
+        records = query(store, args)
+        elapsed = time.perf_counter() - start
+        json.dump(records, sys.stdout, ensure_ascii=False, indent=4)
+        print("\n共 {} 条,查询耗时 {:.1f}ms".format(len(records), elapsed * 1000))
+    store.close()